@@ -1,34 +1,113 @@
+import hashlib
+import hmac
 import os
 import pathlib
 import uuid
+from heapq import nlargest
+from threading import RLock
+import msgspec
+import orjson
 from flask import Flask, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from flask_compress import Compress
 from dotenv import load_dotenv
 from semantic_kernel_client import QuizGenerator
-from quiz_service import QuizManager
-from typing import Dict, Any
+from quiz_service import QuizManager, SESSION_TTL, MAX_SESSIONS, MAX_QUESTIONS
+from storage import REDIS_URL, create_store, get_redis
+from typing import Dict, Any, List, Optional
 
 load_dotenv()
 
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Serialize JSON responses with orjson instead of the stdlib encoder."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
+Compress(app)  # gzip/br responses for clients that accept it
 
 RAW_DATASET_PATH = os.getenv("MOVIE_DATASET", os.path.join(os.path.dirname(__file__), "..", "movies.csv"))
 DATASET_PATH = str(pathlib.Path(RAW_DATASET_PATH).resolve())
 print(f"[backend] Using dataset: {DATASET_PATH}")
 
-quiz_generator = QuizGenerator(csv_path=DATASET_PATH)
-quiz_manager = QuizManager(quiz_generator)
+quiz_generator = QuizGenerator(csv_path=DATASET_PATH, debug=os.getenv("QUIZ_DEBUG") == "1")
+quiz_manager = QuizManager(
+    quiz_generator,
+    sessions=create_store("session:", max_items=MAX_SESSIONS, ttl=SESSION_TTL),
+    questions=create_store("question:", max_items=MAX_QUESTIONS, ttl=SESSION_TTL),
+)
+print(f"[backend] State storage: {'Redis' if REDIS_URL else 'in-memory'}")
 
-# Simple in-memory user storage (in production, use a proper database)
-users: Dict[str, Dict[str, Any]] = {}
+# User storage, in memory unless REDIS_URL is set (see storage.py)
+users = create_store("user:")  # email -> user record
+# Index from user_id to email for O(1) lookups
+users_by_id = create_store("user_id:")
 # User scores and stats storage
-user_scores: Dict[str, Dict[str, Any]] = {}
+user_scores = create_store("scores:")
+# Serializes read-modify-write of stats and the leaderboard cache within this process
+scores_lock = RLock()
+# Cached top-N leaderboard, rebuilt only after users or scores change.
+# With Redis the leaderboard is a sorted set of user_id by total_score instead.
+LEADERBOARD_SIZE = 20
+LEADERBOARD_KEY = "lb:total_score"
+redis_client = get_redis()
+_leaderboard_cache: List[Dict[str, Any]] = []
+_leaderboard_dirty = True
+
+
+class AnswerRequest(msgspec.Struct):
+    """Body of POST /api/quiz/answer, decoded and validated in one pass."""
+    session_id: str
+    question_id: str
+    answer_index: int = -1  # -1 means the question timed out
+    time_left: int = 0
+
+
+def _json_body() -> Dict[str, Any]:
+    # Parsed once per request; Flask caches the result for any repeat call
+    data = request.get_json(force=True, silent=True, cache=True)
+    return data if isinstance(data, dict) else {}
+
+
+def _as_int(value: Any, default: int) -> Optional[int]:
+    """Return value as an int, the default when absent, or None when invalid."""
+    if value is None:
+        return default
+    if isinstance(value, int):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
+    email = users_by_id.get(user_id)
+    return users.get(email) if email else None
+
+
+def _hash_password(password: str, salt: bytes) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=16384, r=8, p=1)
+
+
+# Hashed against when the email is unknown, so login takes as long as for a real account
+_DUMMY_SALT = os.urandom(16)
+_DUMMY_HASH = _hash_password("", _DUMMY_SALT)
 
 
 @app.route("/api/auth/register", methods=["POST"])
 def register_user():
-    data = request.get_json()
+    global _leaderboard_dirty
+    data = _json_body()
     if not data:
         return jsonify({"error": "Invalid request data"}), 400
     
@@ -39,30 +118,40 @@ def register_user():
     if not email or not password or not preferred_genre:
         return jsonify({"error": "Email, password, and preferred genre are required"}), 400
     
-    # Check if user already exists
-    if email in users:
-        return jsonify({"error": "User already exists"}), 409
+    # Default to the email prefix; computed once here rather than on every read
+    display_name = data.get("display_name") or email.split('@')[0]
+    
+    salt = os.urandom(16)
+    pw_hash = _hash_password(password, salt)
     
-    # Create new user
+    # Create new user; add() is atomic, so concurrent registrations can't both win
     user_id = str(uuid.uuid4())
-    users[email] = {
+    created = users.add(email, {
         "user_id": user_id,
         "email": email,
-        "password": password,  # In production, hash this!
+        "salt": salt,
+        "pw_hash": pw_hash,
         "preferred_genre": preferred_genre,
-        "display_name": email.split('@')[0],  # Use email prefix as display name
+        "display_name": display_name,
         "created_at": "2025-09-18"  # In production, use actual timestamp
-    }
+    })
+    if not created:
+        return jsonify({"error": "User already exists"}), 409
+    users_by_id.set(user_id, email)
     
     # Initialize user scores
-    user_scores[user_id] = {
-        "total_score": 0,
-        "quizzes_played": 0,
-        "correct_answers": 0,
-        "current_streak": 0,
-        "longest_streak": 0,
-        "best_score": 0
-    }
+    with scores_lock:
+        user_scores.set(user_id, {
+            "total_score": 0,
+            "quizzes_played": 0,
+            "correct_answers": 0,
+            "current_streak": 0,
+            "longest_streak": 0,
+            "best_score": 0
+        })
+        if redis_client is not None:
+            redis_client.zadd(LEADERBOARD_KEY, {user_id: 0})
+        _leaderboard_dirty = True
     
     return jsonify({
         "message": "User registered successfully",
@@ -73,7 +162,7 @@ def register_user():
 
 @app.route("/api/auth/login", methods=["POST"])
 def login_user():
-    data = request.get_json()
+    data = _json_body()
     if not data:
         return jsonify({"error": "Invalid request data"}), 400
     
@@ -84,7 +173,10 @@ def login_user():
         return jsonify({"error": "Email and password are required"}), 400
     
     user = users.get(email)
-    if not user or user["password"] != password:
+    if user is None:
+        hmac.compare_digest(_DUMMY_HASH, _hash_password(password, _DUMMY_SALT))
+        return jsonify({"error": "Invalid credentials"}), 401
+    if not hmac.compare_digest(user["pw_hash"], _hash_password(password, user["salt"])):
         return jsonify({"error": "Invalid credentials"}), 401
     
     return jsonify({
@@ -96,127 +188,166 @@ def login_user():
 
 
 @app.route("/api/quiz/start", methods=["POST"])
-def start_quiz():
-    data = request.get_json(silent=True) or {}
-    total_questions = int(data.get("total_questions", 10))
+async def start_quiz():
+    data = _json_body()
+    total_questions = _as_int(data.get("total_questions"), 10)
+    if total_questions is None:
+        return jsonify({"error": "Invalid total_questions"}), 400
     user_id = data.get("user_id")
-    preferred_genre = None
     
-    # Find user's preferred genre if user_id is provided
-    if user_id:
-        for user_data in users.values():
-            if user_data["user_id"] == user_id:
-                preferred_genre = user_data["preferred_genre"]
-                break
+    # Use the user's preferred genre if user_id is provided
+    user_data = _get_user_by_id(user_id) if user_id else None
+    preferred_genre = user_data["preferred_genre"] if user_data else None
     
-    resp = quiz_manager.start_session(total_questions=total_questions, preferred_genre=preferred_genre, user_id=user_id)
+    resp = await quiz_manager.astart_session(total_questions=total_questions, preferred_genre=preferred_genre, user_id=user_id)
     return jsonify(resp)
 
 
 @app.route("/api/quiz/answer", methods=["POST"])
-def answer_question():
-    data = request.get_json(force=True)
-    session_id = data.get("session_id")
-    question_id = data.get("question_id")
-    answer_index = int(data.get("answer_index", -1))
-    time_left = int(data.get("time_left", 0))
-    if session_id is None or question_id is None:
-        return jsonify({"error": "Missing required fields"}), 400
+async def answer_question():
+    try:
+        # strict=False still accepts numeric strings such as "2"
+        req = msgspec.json.decode(request.get_data(cache=True), type=AnswerRequest, strict=False)
+    except msgspec.ValidationError as e:
+        return jsonify({"error": f"Missing or invalid fields: {e}"}), 400
+    except msgspec.DecodeError:
+        return jsonify({"error": "Invalid request data"}), 400
     # Allow answer_index = -1 for timeouts, but validate it's not less than -1
-    if answer_index < -1:
+    if req.answer_index < -1:
         return jsonify({"error": "Invalid answer index"}), 400
-    resp = quiz_manager.answer_question(session_id, question_id, answer_index, time_left)
+    resp = await quiz_manager.aanswer_question(req.session_id, req.question_id, req.answer_index, req.time_left)
     status = 200 if "error" not in resp else 400
     return jsonify(resp), status
 
 
+def _apply_quiz_result(stats: Dict[str, Any], final_score: int, correct_answers: int, total_questions: int) -> Dict[str, Any]:
+    """Stats after one finished quiz; a new dict, so a retried update starts from fresh stats."""
+    # Simple streak logic (would need proper date tracking in production)
+    if correct_answers > total_questions / 2:  # More than 50% correct
+        current_streak = stats["current_streak"] + 1
+    else:
+        current_streak = 0
+    return {
+        **stats,
+        "total_score": stats["total_score"] + final_score,
+        "quizzes_played": stats["quizzes_played"] + 1,
+        "correct_answers": stats["correct_answers"] + correct_answers,
+        "best_score": max(stats["best_score"], final_score),
+        "current_streak": current_streak,
+        "longest_streak": max(stats["longest_streak"], current_streak),
+    }
+
+
 @app.route("/api/quiz/complete", methods=["POST"])
 def complete_quiz():
-    data = request.get_json()
+    global _leaderboard_dirty
+    data = _json_body()
     if not data:
         return jsonify({"error": "Invalid request data"}), 400
     
     session_id = data.get("session_id")
-    final_score = data.get("final_score", 0)
-    correct_answers = data.get("correct_answers", 0)
-    total_questions = data.get("total_questions", 0)
+    final_score = _as_int(data.get("final_score"), 0)
+    correct_answers = _as_int(data.get("correct_answers"), 0)
+    total_questions = _as_int(data.get("total_questions"), 0)
+    # Checked before the session is ended, so a rejected request can be retried
+    if final_score is None or correct_answers is None or total_questions is None:
+        return jsonify({"error": "Invalid final_score, correct_answers or total_questions"}), 400
     
-    # Find the session to get user_id
-    session = quiz_manager.sessions.get(session_id)
+    # Find the session to get user_id; it is finished after this call
+    session = quiz_manager.end_session(session_id)
     if not session:
         return jsonify({"error": "Invalid session"}), 400
     
     user_id = session.user_id
-    if user_id and user_id in user_scores:
-        stats = user_scores[user_id]
-        stats["total_score"] += final_score
-        stats["quizzes_played"] += 1
-        stats["correct_answers"] += correct_answers
-        if final_score > stats["best_score"]:
-            stats["best_score"] = final_score
-        
-        # Simple streak logic (would need proper date tracking in production)
-        if correct_answers > total_questions / 2:  # More than 50% correct
-            stats["current_streak"] += 1
-            if stats["current_streak"] > stats["longest_streak"]:
-                stats["longest_streak"] = stats["current_streak"]
-        else:
-            stats["current_streak"] = 0
+    if user_id:
+        def apply(stats: Dict[str, Any]) -> Dict[str, Any]:
+            return _apply_quiz_result(stats, final_score, correct_answers, total_questions)
+
+        with scores_lock:
+            if redis_client is not None:
+                # Stats and the leaderboard score commit together; other workers' writes force a retry
+                updated = user_scores.update(
+                    user_id, apply, on_write=lambda pipe: pipe.zincrby(LEADERBOARD_KEY, final_score, user_id)
+                )
+            else:
+                updated = user_scores.update(user_id, apply)
+            if updated is not None:
+                _leaderboard_dirty = True
     
     return jsonify({"message": "Quiz completed successfully"}), 200
 
 
 @app.route("/api/leaderboard", methods=["GET"])
 def get_leaderboard():
-    # Create leaderboard from registered users
+    global _leaderboard_cache, _leaderboard_dirty
+    if redis_client is not None:
+        # Other workers update scores too, so read the sorted set every time
+        return jsonify({"leaderboard": _build_redis_leaderboard()}), 200
+    with scores_lock:
+        if _leaderboard_dirty:
+            _leaderboard_cache = _build_leaderboard()
+            _leaderboard_dirty = False
+        leaderboard = _leaderboard_cache
+    return jsonify({"leaderboard": leaderboard}), 200
+
+
+def _leaderboard_entry(user_data: Dict[str, Any], stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    stats = stats or {}
+    return {
+        "user_id": user_data["user_id"],
+        "name": user_data["display_name"],
+        "email": user_data["email"],
+        "preferred_genre": user_data.get("preferred_genre", ""),
+        "total_score": stats.get("total_score", 0),
+        "quizzes_played": stats.get("quizzes_played", 0),
+        "current_streak": stats.get("current_streak", 0),
+        "best_score": stats.get("best_score", 0)
+    }
+
+
+def _build_leaderboard() -> List[Dict[str, Any]]:
+    # Only the top entries are served: pick them from the raw stats with a
+    # size-N heap, then build response entries for those users alone
+    top = nlargest(LEADERBOARD_SIZE, user_scores.items(), key=lambda item: item[1]["total_score"])
     leaderboard = []
-    
-    for email, user_data in users.items():
-        user_id = user_data["user_id"]
-        stats = user_scores.get(user_id, {})
-        
-        leaderboard.append({
-            "user_id": user_id,
-            "name": user_data.get("display_name", email.split('@')[0]),
-            "email": email,
-            "preferred_genre": user_data.get("preferred_genre", ""),
-            "total_score": stats.get("total_score", 0),
-            "quizzes_played": stats.get("quizzes_played", 0),
-            "current_streak": stats.get("current_streak", 0),
-            "best_score": stats.get("best_score", 0)
-        })
-    
-    # Sort by total score (descending)
-    leaderboard.sort(key=lambda x: x["total_score"], reverse=True)
-    
+    for user_id, stats in top:
+        user_data = _get_user_by_id(user_id)
+        if user_data:
+            leaderboard.append(_leaderboard_entry(user_data, stats))
+    return _add_ranks(leaderboard)
+
+
+def _build_redis_leaderboard() -> List[Dict[str, Any]]:
+    # ZREVRANGE returns the top user_ids already ordered; fetch only those records
+    user_ids = [member.decode() for member in redis_client.zrevrange(LEADERBOARD_KEY, 0, LEADERBOARD_SIZE - 1)]
+    emails = users_by_id.get_many(user_ids)
+    records = [record for record in users.get_many([email for email in emails if email]) if record]
+    all_stats = user_scores.get_many([record["user_id"] for record in records])
+    leaderboard = [_leaderboard_entry(record, stats) for record, stats in zip(records, all_stats)]
+    return _add_ranks(leaderboard)
+
+
+def _add_ranks(leaderboard: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     # Add ranks
     for i, entry in enumerate(leaderboard):
         entry["rank"] = i + 1
     
-    return jsonify({"leaderboard": leaderboard[:20]}), 200  # Top 20
+    return leaderboard
 
 
 @app.route("/api/profile/<user_id>", methods=["GET"])
 def get_user_profile(user_id):
-    # Find user by user_id
-    user_data = None
-    user_email = None
-    
-    for email, data in users.items():
-        if data["user_id"] == user_id:
-            user_data = data
-            user_email = email
-            break
-    
+    user_data = _get_user_by_id(user_id)
     if not user_data:
         return jsonify({"error": "User not found"}), 404
     
-    stats = user_scores.get(user_id, {})
+    user_email = user_data["email"]
+    stats = user_scores.get(user_id) or {}
     
     profile = {
         "user_id": user_id,
         "email": user_email,
-        "display_name": user_data.get("display_name", user_email.split('@')[0]),
+        "display_name": user_data["display_name"],
         "preferred_genre": user_data.get("preferred_genre", ""),
         "created_at": user_data.get("created_at", "2025-09-18"),
         "total_score": stats.get("total_score", 0),
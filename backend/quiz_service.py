@@ -1,10 +1,19 @@
-import uuid
+import secrets
 from dataclasses import dataclass, field
-from typing import Dict, List, Any
-from semantic_kernel_client import QuizGenerator
+from typing import Dict, List, Any, Optional, Tuple
+from semantic_kernel_client import QuizGenerator, QuizQuestion
+from storage import MemoryStore
 
+# Upper bounds for the in-memory stores; the least recently used entries are evicted first
+MAX_SESSIONS = 10_000
+MAX_QUESTIONS = 50_000
+# Expiry in seconds for sessions and questions kept in Redis
+SESSION_TTL = 3600
+# Answers kept per session; only recent performance feeds difficulty and prompts
+HISTORY_LIMIT = 20
 
-@dataclass
+
+@dataclass(slots=True)
 class QuizSession:
     session_id: str
     difficulty_level: int = 1  # 1 easy, 2 medium, 3 hard
@@ -14,41 +23,55 @@ class QuizSession:
     questions_served: int = 0
     preferred_genre: str = None  # User's preferred movie genre
     user_id: str = None  # Associated user ID
+    question_ids: List[str] = field(default_factory=list)  # Questions served in this session
+    last_correct: Optional[bool] = None  # Outcome of the most recent answer
 
     def adjust_difficulty(self):
-        if len(self.history) == 0:
+        if self.last_correct is None:
             return
-        last_correct = self.history[-1].get("correct")
-        if last_correct and self.difficulty_level < 3:
+        if self.last_correct and self.difficulty_level < 3:
             self.difficulty_level += 1
-        elif not last_correct and self.difficulty_level > 1:
+        elif not self.last_correct and self.difficulty_level > 1:
             self.difficulty_level -= 1
 
 
 class QuizManager:
-    def __init__(self, generator: QuizGenerator):
+    def __init__(self, generator: QuizGenerator, sessions=None, questions=None):
         self.generator = generator
-        self.sessions: Dict[str, QuizSession] = {}
-        self._questions: Dict[str, Dict[str, Any]] = {}  # question_id -> data
+        # Any storage.py store works; default to bounded in-process ones
+        self.sessions = sessions if sessions is not None else MemoryStore(max_items=MAX_SESSIONS)
+        self._questions = questions if questions is not None else MemoryStore(max_items=MAX_QUESTIONS)  # question_id -> data
 
     def start_session(self, total_questions: int = 10, preferred_genre: str = None, user_id: str = None) -> Dict[str, Any]:
-        session_id = str(uuid.uuid4())
+        session = self._new_session(total_questions, preferred_genre, user_id)
+        qdata = self.generator.generate_question(session.difficulty_level, session.history, session.preferred_genre)
+        return self._start_payload(session, self._register_question(session, qdata))
+
+    async def astart_session(self, total_questions: int = 10, preferred_genre: str = None, user_id: str = None) -> Dict[str, Any]:
+        session = self._new_session(total_questions, preferred_genre, user_id)
+        qdata = await self.generator.agenerate_question(session.difficulty_level, session.history, session.preferred_genre)
+        return self._start_payload(session, self._register_question(session, qdata))
+
+    def _new_session(self, total_questions: int, preferred_genre: Optional[str], user_id: Optional[str]) -> QuizSession:
+        session_id = secrets.token_urlsafe(12)
         session = QuizSession(session_id=session_id, total_questions=total_questions, preferred_genre=preferred_genre)
         session.user_id = user_id  # Store user_id in session
-        self.sessions[session_id] = session
-        question_payload = self._create_question(session)
+        return session
+
+    def _start_payload(self, session: QuizSession, question_payload: Dict[str, Any]) -> Dict[str, Any]:
         return {
-            "session_id": session_id,
+            "session_id": session.session_id,
             "question": question_payload,
             "score": 0,
             "questions_remaining": session.total_questions - session.questions_served,
         }
 
-    def _create_question(self, session: QuizSession) -> Dict[str, Any]:
-        qdata = self.generator.generate_question(session.difficulty_level, session.history, session.preferred_genre)
-        question_id = str(uuid.uuid4())
-        self._questions[question_id] = qdata
+    def _register_question(self, session: QuizSession, qdata: QuizQuestion) -> Dict[str, Any]:
+        question_id = secrets.token_urlsafe(12)
+        self._questions.set(question_id, qdata)
+        session.question_ids.append(question_id)
         session.questions_served += 1
+        self.sessions.set(session.session_id, session)
         return {
             "id": question_id,
             "question": qdata["question"],
@@ -58,13 +81,42 @@ class QuizManager:
             "total": session.total_questions,
         }
 
+    def get_session(self, session_id: str) -> Optional[QuizSession]:
+        return self.sessions.get(session_id)
+
+    def end_session(self, session_id: str) -> Optional[QuizSession]:
+        """Remove a finished session and any of its questions still held."""
+        session = self.sessions.pop(session_id)
+        if session:
+            self._forget_questions(session)
+        return session
+
+    def _forget_questions(self, session: QuizSession):
+        for question_id in session.question_ids:
+            self._questions.pop(question_id)
+        session.question_ids.clear()
+
     def answer_question(self, session_id: str, question_id: str, answer_index: int, time_left: int = 0) -> Dict[str, Any]:
-        session = self.sessions.get(session_id)
+        session, resp = self._record_answer(session_id, question_id, answer_index, time_left)
+        if session is None or resp["quiz_complete"]:
+            return resp
+        qdata = self.generator.generate_question(session.difficulty_level, session.history, session.preferred_genre)
+        return self._next_payload(session, resp, self._register_question(session, qdata))
+
+    async def aanswer_question(self, session_id: str, question_id: str, answer_index: int, time_left: int = 0) -> Dict[str, Any]:
+        session, resp = self._record_answer(session_id, question_id, answer_index, time_left)
+        if session is None or resp["quiz_complete"]:
+            return resp
+        qdata = await self.generator.agenerate_question(session.difficulty_level, session.history, session.preferred_genre)
+        return self._next_payload(session, resp, self._register_question(session, qdata))
+
+    def _record_answer(self, session_id: str, question_id: str, answer_index: int, time_left: int) -> Tuple[Optional[QuizSession], Dict[str, Any]]:
+        session = self.get_session(session_id)
         if not session:
-            return {"error": "Invalid session"}
+            return None, {"error": "Invalid session"}
         qdata = self._questions.get(question_id)
         if not qdata:
-            return {"error": "Invalid question"}
+            return None, {"error": "Invalid question"}
         correct_index = qdata["answer_index"]
         
         # Handle timeout case (answer_index = -1)
@@ -83,22 +135,26 @@ class QuizManager:
             "timeout": is_timeout,
             "difficulty_level": session.difficulty_level,
         })
+        if len(session.history) > HISTORY_LIMIT:
+            session.history = session.history[-HISTORY_LIMIT:]
+        session.last_correct = is_correct
         session.adjust_difficulty()
         # Determine if quiz complete
-        if session.questions_served >= session.total_questions:
-            return {
-                "correct": is_correct,
-                "correct_index": correct_index,
-                "score": session.score,
-                "quiz_complete": True,
-            }
-        # Otherwise next question
-        next_question = self._create_question(session)
-        return {
+        quiz_complete = session.questions_served >= session.total_questions
+        if quiz_complete:
+            # The session stays around for /api/quiz/complete, but its questions are done
+            self._forget_questions(session)
+        self.sessions.set(session.session_id, session)
+        return session, {
             "correct": is_correct,
             "correct_index": correct_index,
             "score": session.score,
-            "quiz_complete": False,
+            "quiz_complete": quiz_complete,
+        }
+
+    def _next_payload(self, session: QuizSession, resp: Dict[str, Any], next_question: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            **resp,
             "next_question": next_question,
             "difficulty_level": session.difficulty_level,
             "questions_remaining": session.total_questions - session.questions_served,
@@ -1,13 +1,16 @@
-import json, time, threading, requests
+import time, requests
 
 print('Attempting health check...')
-for i in range(10):
-    try:
-        r = requests.get('http://127.0.0.1:5000/api/health', timeout=1)
-        print('Health:', r.text)
-        break
-    except Exception as e:
-        print('Retry', i+1, e)
-        time.sleep(0.5)
-else:
-    print('Failed to reach server')
+# One pooled session reuses the connection; back off exponentially between tries
+with requests.Session() as session:
+    for attempt, delay in enumerate((0.1, 0.2, 0.4, 0.8, 1.6, None), start=1):
+        try:
+            r = session.get('http://127.0.0.1:5000/api/health', timeout=1)
+            print('Health:', r.text)
+            break
+        except Exception as e:
+            print('Retry', attempt, e)
+            if delay is not None:
+                time.sleep(delay)
+    else:
+        print('Failed to reach server')
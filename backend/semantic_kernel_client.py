@@ -1,8 +1,17 @@
+import asyncio
+import hashlib
+import importlib.util
+import json
 import os
 import re
+import tempfile
+from functools import lru_cache
 import random
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Tuple, TypedDict
 
 from semantic_kernel import Kernel
 try:
@@ -14,6 +23,8 @@ except Exception:  # pragma: no cover
         ChatHistory = None  # type: ignore
 from typing import TYPE_CHECKING
 
+from storage import MemoryStore
+
 # Attempt to import Google connector; if unavailable we'll fall back.
 try:  # pragma: no cover - optional dependency
     from semantic_kernel.connectors.ai.google.google_ai import (
@@ -33,19 +44,557 @@ except Exception:  # pragma: no cover
     OpenAIChatCompletion = None  # type: ignore
     OpenAIChatPromptExecutionSettings = None  # type: ignore
 
+try:  # pragma: no cover - optional dependency for the Parquet dataset cache
+    import pyarrow  # type: ignore  # noqa: F401
+except Exception:  # pragma: no cover
+    pyarrow = None  # type: ignore
+
+# Optional dependency for the semantic response cache. Only probed here: importing it pulls in
+# torch, which would add seconds to every worker boot, so _SemanticCache imports it on first use.
+HAS_SENTENCE_TRANSFORMERS = importlib.util.find_spec("sentence_transformers") is not None
+
+
+# Upper bound on LLM requests in flight at once, to stay inside provider rate limits
+LLM_CONCURRENCY = 8
+# Offline pre-generation: OpenAI Batch API polling, or wider fan-out for providers without it
+OPENAI_MODEL = "gpt-4o-mini"
+OFFLINE_CONCURRENCY = 50
+BATCH_POLL_INTERVAL = 30  # seconds
+# Most (difficulty, genre) candidate lists kept for movie selection
+SAMPLER_CACHE_SIZE = 512
+# Keep-alive pool shared by every OpenAI request, so calls skip the TCP/TLS handshake
+HTTP_MAX_KEEPALIVE = 100
+# Response caching: only worthwhile when sampling is close to deterministic
+CACHE_MAX_TEMPERATURE = 0.4
+PROMPT_CACHE_SIZE = 1024
+SEMANTIC_CACHE_MODEL = "all-MiniLM-L6-v2"
+SEMANTIC_CACHE_THRESHOLD = 0.87
+SEMANTIC_CACHE_SIZE = 512
+# Streamed responses with no question marker after this many characters (~300 tokens) are abandoned
+STREAM_ABORT_CHARS = 1200
+# The exact response layout STATIC_SYSTEM_PROMPT asks for, matched in a single pass
+_RESP_RE = re.compile(
+    r"^Q:\s*(.*?)\n\s*A\.\s*(.*?)\n\s*B\.\s*(.*?)\n\s*C\.\s*(.*?)\n\s*D\.\s*(.*?)\n\s*Answer:\s*([A-D])",
+    re.S | re.M,
+)
+# Looser patterns for responses that stray from that layout, tried in order
+_QUESTION_PATTERNS = tuple(re.compile(p, re.DOTALL | re.IGNORECASE) for p in (
+    r"Q:\s*(.+?)(?=\n[A-D]\.|$)",  # Q: question until option A-D
+    r"Question:\s*(.+?)(?=\n[A-D]\.|$)",  # Question: alternative
+    r"\*\*Question\*\*:\s*(.+?)(?=\n[A-D]\.|$)",  # **Question**: markdown
+))
+# "A. option" or "**A**: option", one pass for both layouts
+_OPTION_RE = re.compile(
+    r"(?:(?P<plain>[A-D])\.|\*\*(?P<bold>[A-D])\*\*[\.:)])\s*(?P<text>.+?)(?=\n[A-D]\.|\nAnswer:|$)",
+    re.DOTALL | re.IGNORECASE,
+)
+# Lowercased literal prefixes that precede the answer letter; "correct" is followed by a colon on its line
+_ANSWER_MARKERS = ("answer:", "correct", "**answer**:", "the correct answer is")
+# One finished field of a streamed response: a field is complete once the next marker begins
+_STREAM_FIELD_RE = re.compile(r"^(Q:|[A-D]\.)\s*(.*?)\n\s*(?=[A-D]\.|Answer:)", re.S | re.M)
+
+
+class MovieRow(NamedTuple):
+    """One dataset row with every field already converted to a stripped string."""
+
+    name: str
+    year: str
+    genre: str
+    director: str
+    plot: str
+    rating: str
+    metascore: str
+    certificate: str
+    runtime: str
+    actors: Tuple[str, ...]  # Non-empty cast names, in billing order
+    # Numeric forms parsed once at load; None when the field is blank or malformed
+    runtime_min: Optional[int]
+    rating_value: Optional[float]
+    metascore_value: Optional[int]
+    name_lower: str  # For the title-mention check on generated questions
+
+
+_DIGITS_RE = re.compile(r"\d+")
+
+
+def _parse_minutes(runtime: str) -> Optional[int]:
+    match = _DIGITS_RE.search(runtime)
+    return int(match.group()) if match else None
+
+
+def _parse_float(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _parse_int(value: str) -> Optional[int]:
+    # Blank-filled numeric columns load as floats, e.g. "81.0"
+    number = _parse_float(value)
+    return None if number is None else int(number)
+
+
+# Range labels indexed by a clamped integer bucket of the numeric value
+RUNTIME_BUCKETS = ("90-120 minutes",) * 4 + ("120-150 minutes", "150-180 minutes", "180+ minutes")  # minutes // 30
+RATING_BUCKETS = ("6.0-7.0", "7.0-8.0", "8.0-9.0", "9.0-10.0")  # int(rating) - 6
+METASCORE_BUCKETS = (  # score // 20
+    "Below 40 (Poor reviews)", "Below 40 (Poor reviews)", "40-59 (Mixed reviews)",
+    "60-79 (Generally positive)", "80-100 (Universal acclaim)", "80-100 (Universal acclaim)",
+)
+
+
+class _QuizQuestionFields(TypedDict):
+    question: str
+    options: List[str]
+    answer_index: int
+    difficulty: str
+
+
+class QuizQuestion(_QuizQuestionFields, total=False):
+    """A generated question; plain dict at runtime, so orjson serializes it natively."""
+
+    raw_response: str  # LLM path with debug enabled only
+    error: str  # Set when the LLM response could not be parsed, or had no question marker
+
+
+# Genre lookup tables used by the prompt builder and the fallback question helpers
+GENRE_FOCUS_AREAS = {
+    "Action": """- High-octane sequences, stunts, and choreography
+- Weapon usage, fight scenes, and chase sequences  
+- Action heroes, villains, and their motivations
+- Special effects, explosions, and practical stunts
+- Franchise connections and action movie tropes""",
+
+    "Drama": """- Character development and emotional arcs
+- Social issues, family dynamics, and relationships
+- Dramatic performances and award recognition
+- Real-life inspirations and biographical elements
+- Dialogue quality and meaningful themes""",
+
+    "Comedy": """- Comedic timing, humor styles, and funny scenes
+- Comic actors and their signature roles
+- Parody elements and satirical themes
+- Memorable quotes and comedic situations
+- Different comedy sub-genres (rom-com, dark comedy, etc.)""",
+
+    "Horror": """- Scare techniques, suspense building, and fear elements
+- Horror sub-genres (slasher, psychological, supernatural)
+- Iconic horror scenes and jump scares
+- Horror movie villains and monsters
+- Gore levels, practical effects, and makeup""",
+
+    "Thriller": """- Suspense building and tension creation
+- Plot twists, mysteries, and reveals
+- Psychological elements and mind games
+- Chase sequences and cat-and-mouse dynamics
+- Paranoia themes and conspiracy elements""",
+
+    "Romance": """- Love stories, relationship dynamics, and chemistry
+- Romantic leads and their on-screen partnerships
+- Meet-cute scenarios and romantic gestures
+- Heartbreak, passion, and emotional moments
+- Wedding scenes, proposals, and happy endings""",
+
+    "Sci-Fi": """- Futuristic concepts, technology, and scientific themes
+- Space travel, aliens, and otherworldly elements
+- Time travel, dystopian futures, and alternate realities
+- Special effects, CGI, and visual innovation
+- Scientific accuracy and theoretical concepts""",
+
+    "Fantasy": """- Magical elements, mythical creatures, and supernatural powers
+- World-building, fictional realms, and fantasy races
+- Quests, prophecies, and hero's journey narratives
+- Magic systems, spells, and fantasy combat
+- Adaptation from fantasy literature and folklore""",
+
+    "Crime": """- Criminal activities, heists, and law enforcement
+- Detective work, investigations, and forensics
+- Organized crime, gangs, and criminal masterminds
+- Courtroom dramas and legal procedures
+- Moral ambiguity and crime consequences""",
+
+    "Western": """- Old West settings, frontier life, and cowboy culture
+- Gunfights, saloons, and horseback riding
+- Outlaws, sheriffs, and justice themes
+- Desert landscapes and small town dynamics
+- Native American relations and historical context""",
+
+    "War": """- Military tactics, battles, and warfare strategies
+- Historical conflicts and war periods
+- Soldier experiences, camaraderie, and sacrifice
+- War's impact on civilians and families
+- Anti-war messages and heroism themes""",
+
+    "Animation": """- Animation techniques and visual styles
+- Voice acting and character performances
+- Family-friendly themes and life lessons
+- Studio signatures (Disney, Pixar, Studio Ghibli)
+- Technical innovation in animation""",
+
+    "Documentary": """- Real-world subjects and factual content
+- Documentary filmmaking techniques
+- Educational value and information presented
+- Interview subjects and expert opinions
+- Social impact and awareness raising""",
+
+    "Musical": """- Musical numbers, songs, and choreography
+- Musical theater adaptations and original scores
+- Singing performances and vocal talents
+- Dance sequences and performance staging
+- Broadway connections and show tunes"""
+}
+DEFAULT_GENRE_FOCUS = """- Genre-specific themes and conventions
+- Typical character archetypes for this genre
+- Common plot devices and storytelling techniques
+- Visual and auditory elements characteristic of this genre
+- Cultural and historical context of the genre"""
+
+GENRE_SUBTYPES = {
+    "Action": "High-octane thriller",
+    "Drama": "Character-driven story", 
+    "Comedy": "Situational comedy",
+    "Horror": "Psychological thriller",
+    "Romance": "Romantic drama",
+    "Sci-Fi": "Science fiction adventure",
+    "Thriller": "Suspense thriller",
+    "Crime": "Crime thriller",
+    "Western": "Classic western",
+    "War": "War drama"
+}
+
+GENRE_THEMES = {
+    "Action": "Good vs evil conflict",
+    "Drama": "Human relationships",
+    "Comedy": "Humor and life lessons", 
+    "Horror": "Fear and survival",
+    "Romance": "Love conquers all",
+    "Sci-Fi": "Technology and humanity",
+    "Thriller": "Suspense and mystery",
+    "Crime": "Justice and morality",
+    "Western": "Frontier justice",
+    "War": "Honor and sacrifice"
+}
+
+GENRE_ELEMENTS = {
+    "Action": "Explosive action sequences",
+    "Drama": "Emotional character arcs",
+    "Comedy": "Comedic timing and wit",
+    "Horror": "Suspenseful atmosphere",
+    "Romance": "Romantic chemistry",
+    "Sci-Fi": "Futuristic concepts",
+    "Thriller": "Edge-of-seat tension",
+    "Crime": "Criminal investigations",
+    "Western": "Frontier landscapes",
+    "War": "Combat realism"
+}
+
+GENRE_COMPARISONS = {
+    "Action": "Mission Impossible series",
+    "Drama": "Forrest Gump",
+    "Comedy": "The Hangover",
+    "Horror": "Halloween franchise", 
+    "Romance": "The Notebook",
+    "Sci-Fi": "Star Wars saga",
+    "Thriller": "North by Northwest",
+    "Crime": "Goodfellas",
+    "Western": "The Good, the Bad and the Ugly",
+    "War": "Saving Private Ryan"
+}
+
+GENRE_TECHNIQUES = {
+    "Action": "Dynamic camera work",
+    "Drama": "Character-focused cinematography",
+    "Comedy": "Comedic timing and editing",
+    "Horror": "Suspenseful sound design",
+    "Romance": "Intimate cinematography",
+    "Sci-Fi": "Visual effects mastery",
+    "Thriller": "Tension-building editing",
+    "Crime": "Noir-style lighting",
+    "Western": "Wide landscape shots",
+    "War": "Realistic battle choreography"
+}
+
+GENRE_ARCHETYPES = {
+    "Action": "Action hero protagonist",
+    "Drama": "Complex character study",
+    "Comedy": "Comedic lead character",
+    "Horror": "Survivor protagonist",
+    "Romance": "Romantic lead couple",
+    "Sci-Fi": "Reluctant hero",
+    "Thriller": "Ordinary person in danger",
+    "Crime": "Antihero protagonist",
+    "Western": "Lone gunslinger",
+    "War": "Soldier protagonist"
+}
+
+GENRE_SUBGENRES = {
+    "Action": "Superhero action",
+    "Drama": "Social drama", 
+    "Comedy": "Romantic comedy",
+    "Horror": "Psychological horror",
+    "Thriller": "Political thriller",
+    "Sci-Fi": "Space opera",
+    "Crime": "Heist thriller"
+}
+
+
+# Distractor pools for fallback questions, by option category (expanded with genre-specific options)
+WRONG_OPTIONS = {
+    "year": ["1995", "2001", "2010", "2015", "1999", "2005", "1990", "2008"],
+    "director": ["Christopher Nolan", "Steven Spielberg", "Quentin Tarantino", "Martin Scorsese", "Ridley Scott", "David Fincher"],
+    "genre": ["Drama", "Action", "Comedy", "Thriller", "Horror", "Romance", "Sci-Fi", "Adventure"],
+    "actor": ["Tom Hanks", "Leonardo DiCaprio", "Brad Pitt", "Robert De Niro", "Al Pacino", "Johnny Depp"],
+    "rating_range": ["6.0-7.0", "7.0-8.0", "8.0-9.0", "9.0-10.0"],
+    "runtime_range": ["90-120 minutes", "120-150 minutes", "150-180 minutes", "180+ minutes"],
+    "decade": ["1980s films", "1990s films", "2000s films", "2010s films"],
+    # Genre-specific wrong options
+    "genre_themes": ["Revenge and justice", "Love and relationships", "Good vs evil", "Coming of age", "Redemption story"],
+    "genre_elements": ["Visual spectacle", "Character development", "Emotional depth", "Technical mastery", "Cultural significance"],
+    "genre_movies": ["Citizen Kane", "The Godfather", "Casablanca", "Singin' in the Rain", "2001: A Space Odyssey"],
+    "genre_techniques": ["Innovative cinematography", "Masterful editing", "Exceptional sound design", "Outstanding performances", "Creative direction"],
+    "genre_archetypes": ["Reluctant hero", "Wise mentor", "Comic relief", "Love interest", "Villain mastermind"],
+    "genre_concepts": ["Groundbreaking storytelling", "Cultural phenomenon", "Technical innovation", "Artistic achievement", "Genre evolution"]
+}
+FAKE_ACTORS = ["Tom Hanks", "Leonardo DiCaprio", "Brad Pitt", "Will Smith"]
+
+# Question type -> WRONG_OPTIONS category used for its distractors
+OPTION_CATEGORIES = {
+    "year": "year", "year_context": "decade",
+    "director": "director", "lead_actor": "actor", "supporting_actor": "actor",
+    "genre": "genre", "genre_combo": "genre", "genre_identification": "genre",
+    "rating_range": "rating_range", "runtime": "runtime_range",
+    "metascore": "rating_range", "genre_rating": "rating_range",
+    # New genre-specific mappings
+    "genre_theme": "genre_themes", "genre_elements": "genre_elements",
+    "genre_comparison": "genre_movies", "genre_technique": "genre_techniques",
+    "genre_character": "genre_archetypes", "genre_innovation": "genre_concepts",
+    "genre_influence": "genre_movies", "genre_subgenre": "genre",
+    "genre_director_style": "genre_techniques", "genre_cultural_impact": "genre_concepts"
+}
+
+SIMILAR_MOVIES = {
+    "Action": "Die Hard series",
+    "Drama": "The Shawshank Redemption", 
+    "Comedy": "Groundhog Day",
+    "Horror": "The Exorcist",
+    "Romance": "Casablanca",
+    "Sci-Fi": "Blade Runner"
+}
+
+DIFFICULTY_WORDS = {1: "easy", 2: "medium", 3: "hard"}
+
+# Answer phrases for the fallback templates. They depend only on the genre (and
+# rating tier), so each distinct phrase is formatted once per process.
+@lru_cache(maxsize=1024)
+def _genre_rating_context(rating: Optional[float], genre: str) -> str:
+    """Rating context within the genre."""
+    if rating is None: return f"Notable {genre.lower()} movie"
+    elif rating >= 8.5: return f"Top-tier {genre.lower()} film"
+    elif rating >= 7.5: return f"Well-regarded {genre.lower()} movie"
+    elif rating >= 6.5: return f"Decent {genre.lower()} entry"
+    else: return f"Average {genre.lower()} film"
+
+
+@lru_cache(maxsize=256)
+def _genre_innovation(genre: str) -> str:
+    """How the film innovated within its genre."""
+    return f"Advanced {genre.lower()} filmmaking techniques"
+
+
+@lru_cache(maxsize=256)
+def _genre_influence(genre: str) -> str:
+    """Films that influenced this one within the genre."""
+    return f"Classic {genre.lower()} cinema traditions"
+
+
+@lru_cache(maxsize=256)
+def _detailed_subgenre(genre: str) -> str:
+    """Specific sub-genre classification."""
+    return GENRE_SUBGENRES.get(genre, f"{genre} drama")
+
+
+@lru_cache(maxsize=256)
+def _director_genre_style(genre: str) -> str:
+    """The director's style within the genre."""
+    return f"Distinctive {genre.lower()} direction"
+
+
+@lru_cache(maxsize=256)
+def _cultural_impact(genre: str) -> str:
+    """The cultural impact within the genre."""
+    return f"Influenced modern {genre.lower()} films"
+
+
+# Fallback question templates by difficulty: (question type, question format, answer function).
+# Answer functions take (generator, movie, primary genre) and run only for the chosen template.
+FALLBACK_TEMPLATES = {
+    1: [  # Easy questions
+        ("year", "In which year was the {genre} film '{name}' released?", lambda gen, m, g: m.year),
+        ("director", "Who directed the {genre} movie '{name}'?", lambda gen, m, g: m.director),
+        ("genre_identification", "'{name}' is primarily what type of {genre} film?", lambda gen, m, g: gen._get_genre_subtype(g, m.plot)),
+        ("lead_actor", "Who stars in the {genre} film '{name}'?", lambda gen, m, g: m.actors[0] if m.actors else "Unknown"),
+        ("genre_theme", "What {genre} theme is central to '{name}'?", lambda gen, m, g: gen._get_genre_theme(g, m.plot)),
+    ],
+    2: [  # Medium questions
+        ("genre_elements", "What {genre} elements make '{name}' distinctive?", lambda gen, m, g: gen._get_genre_elements(g, m.plot)),
+        ("genre_comparison", "'{name}' is similar to which other {genre} film?", lambda gen, m, g: gen._get_genre_similar_movie(g)),
+        ("genre_technique", "What {genre} filmmaking technique is used in '{name}'?", lambda gen, m, g: gen._get_genre_technique(g)),
+        ("genre_character", "What type of {genre} character archetype appears in '{name}'?", lambda gen, m, g: gen._get_genre_archetype(g, m.actors)),
+        ("genre_rating", "How does '{name}' rate among {genre} films?", lambda gen, m, g: _genre_rating_context(m.rating_value, g)),
+        ("runtime", "What is the typical runtime for a {genre} film like '{name}'?", lambda gen, m, g: gen._get_runtime_range(m.runtime_min)),
+    ],
+    3: [  # Hard questions
+        ("genre_innovation", "How did '{name}' innovate within the {genre} genre?", lambda gen, m, g: _genre_innovation(g)),
+        ("genre_influence", "What {genre} films influenced '{name}'?", lambda gen, m, g: _genre_influence(g)),
+        ("genre_subgenre", "'{name}' belongs to which {genre} sub-genre?", lambda gen, m, g: _detailed_subgenre(g)),
+        ("genre_director_style", "What {genre} directorial style does '{director}' use in '{name}'?", lambda gen, m, g: _director_genre_style(g)),
+        ("genre_cultural_impact", "How did '{name}' impact the {genre} genre?", lambda gen, m, g: _cultural_impact(g)),
+    ],
+}
+
+
+@lru_cache(maxsize=128)
+def _genre_system_prompt(primary_genre: str) -> str:
+    """Genre-specific instructions; the same for every movie of that genre."""
+    genre_focus = GENRE_FOCUS_AREAS.get(primary_genre, DEFAULT_GENRE_FOCUS)
+    return f"""
+You specialize in {primary_genre.upper()} films.
+
+🎯 PRIORITIZE {primary_genre.upper()}-SPECIFIC QUESTIONS!
+
+For {primary_genre} movies, focus on:
+{genre_focus}
+
+You can also ask about:
+- {primary_genre}-typical plot elements and themes
+- Characteristic {primary_genre} cinematography/techniques  
+- Iconic {primary_genre} movie comparisons
+- {primary_genre} genre conventions and tropes
+- Cast known for {primary_genre} roles
+- Directors famous in the {primary_genre} genre
+
+Make it {primary_genre}-specific and genre-relevant!
+"""
+
+
+
+@lru_cache(maxsize=4096)
+def _movie_user_prompt(movie: "MovieRow", difficulty_word: str) -> str:
+    """Everything in the user message except the performance summary, which ends it."""
+    genre = movie.genre
+    primary_genre = genre.split(',')[0].strip() if genre else "Drama"
+    return f"""
+Create a {difficulty_word} question that specifically tests {primary_genre} movie knowledge and genre expertise.
+
+Movie Information:
+Title: {movie.name}
+Year: {movie.year}
+Genre: {genre} (PRIMARY: {primary_genre})
+Director: {movie.director}
+Main Cast: {', '.join(movie.actors)}
+Plot: {movie.plot}
+Rating: {movie.rating}/10  |  Metascore: {movie.metascore}
+Certificate: {movie.certificate}  |  Runtime: {movie.runtime}
+
+User Performance: """
+
+
+class _SemanticCache:
+    """Reuses parsed answers for prompts whose embeddings are near-identical to a previous one."""
+
+    def __init__(self, model_name: str, threshold: float, max_entries: int):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._model = None
+        # Entries are scoped per (movie, difficulty) so only prompts about the same movie compare.
+        # Each scope stacks its embeddings into one matrix; scopes are evicted least recently used.
+        self._scopes: "OrderedDict[Tuple[str, int], Tuple[np.ndarray, List[QuizQuestion]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._model_lock = threading.Lock()  # Separate, so a slow model load doesn't block set()
+
+    def _embed(self, text: str) -> np.ndarray:
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer  # type: ignore
+
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model.encode(text, normalize_embeddings=True)
+
+    def get(self, scope: Tuple[str, int], prompt: str) -> Tuple[Optional[QuizQuestion], np.ndarray]:
+        embedding = self._embed(prompt)
+        with self._lock:
+            entry = self._scopes.get(scope)
+            if entry is None:
+                return None, embedding
+            self._scopes.move_to_end(scope)
+        matrix, results = entry
+        # Embeddings are normalized, so one matrix-vector product gives every cosine similarity
+        scores = matrix @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] >= self.threshold:
+            return results[best], embedding
+        return None, embedding
+
+    def set(self, scope: Tuple[str, int], embedding: np.ndarray, result: QuizQuestion):
+        with self._lock:
+            matrix, results = self._scopes.pop(scope, (None, []))
+            matrix = embedding[np.newaxis] if matrix is None else np.vstack((matrix, embedding))
+            self._scopes[scope] = (matrix, results + [result])
+            self._size += 1
+            while self._size > self.max_entries:
+                _, (_, evicted) = self._scopes.popitem(last=False)
+                self._size -= len(evicted)
+
 
 class QuizGenerator:
     """Encapsulates Semantic Kernel based quiz question generation with adaptive difficulty."""
 
-    def __init__(self, csv_path: str):
+    def __init__(self, csv_path: str, debug: bool = False):
         self.csv_path = csv_path
+        self.debug = debug  # Attach the start of each LLM response to its parsed question
         self.df = self._load_dataset(csv_path)
+        self._build_indexes()
         self.kernel: Optional[Kernel] = None
         self.chat_service: Optional[GoogleAIChatCompletion] = None
         self.execution_settings: Optional[GoogleAIChatPromptExecutionSettings] = None
-        self._maybe_init_kernel()
+        self._exact_cache = MemoryStore(max_items=PROMPT_CACHE_SIZE)  # sha256(prompt) -> parsed question, LRU
+        self._semantic_cache = (
+            _SemanticCache(SEMANTIC_CACHE_MODEL, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE)
+            if HAS_SENTENCE_TRANSFORMERS else None
+        )
+        # The SDK client is built on first use so startup does not wait on it
+        self._kernel_ready = False
+        self._init_lock = threading.Lock()
+        self._thread_state = threading.local()
+        # Pooled connections belong to one event loop, so pooled calls run on this background loop
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._openai_client = None
+
+    @classmethod
+    async def aload(cls, csv_path: str, debug: bool = False) -> "QuizGenerator":
+        """Construct in a worker thread so dataset parsing and indexing don't block the event loop."""
+        return await asyncio.to_thread(cls, csv_path, debug)
+
+    @property
+    def _rng(self) -> random.Random:
+        """Per-thread generator, so request threads never share random state."""
+        rng = getattr(self._thread_state, "rng", None)
+        if rng is None:
+            rng = self._thread_state.rng = random.Random()
+        return rng
 
     def _load_dataset(self, path: str) -> pd.DataFrame:
+        # A cleaned Parquet copy next to the CSV skips parsing and column cleanup on later boots
+        parquet_path = os.path.splitext(path)[0] + ".parquet"
+        if pyarrow is not None and os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(path):
+            try:
+                return pd.read_parquet(parquet_path)
+            except Exception as e:
+                print(f"[QuizGenerator] Ignoring unreadable dataset cache {parquet_path}: {e}")
         try:
             df = pd.read_csv(path).fillna("")
             df.columns = (
@@ -54,9 +603,71 @@ class QuizGenerator:
                 .str.replace('"', "")
                 .str.replace("\n", "")
             )
-            return df
+            # Mixed number/blank columns become strings so Parquet can store them
+            df = df.astype({col: str for col in df.columns if df[col].dtype == object})
         except Exception as e:
             raise RuntimeError(f"Failed to load dataset {path}: {e}")
+        if pyarrow is not None:
+            # Written beside the target and renamed in, so workers booting together never read a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(parquet_path) or ".", suffix=".parquet.tmp")
+            os.close(fd)
+            try:
+                df.to_parquet(tmp_path, compression="zstd", index=False)
+                os.replace(tmp_path, parquet_path)
+            except Exception as e:
+                print(f"[QuizGenerator] Could not write dataset cache {parquet_path}: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return df
+
+    def _build_indexes(self):
+        """Precompute the movie rows and the row positions used by _select_movie_row."""
+        df = self.df
+
+        def column(name: str) -> List[str]:
+            if name not in df.columns:
+                return [""] * len(df)
+            return [str(value).strip() for value in df[name].tolist()]
+
+        actor_columns = zip(*(column(f"ACTOR {i}") for i in (1, 2, 3, 4)))
+        self._rows: List[MovieRow] = [
+            MovieRow(name, year.replace("-", "").strip(), genre, director, plot, rating, metascore,
+                     certificate, runtime, tuple(actor for actor in actors if actor),
+                     _parse_minutes(runtime), _parse_float(rating),
+                     _parse_int(metascore), name.lower())
+            for name, year, genre, director, plot, rating, metascore, certificate, runtime, actors in zip(
+                column("movie name"), column("Year"), column("genre"), column("DIRECTOR"),
+                column("DETAIL ABOUT MOVIE"), column("RATING"), column("metascore"),
+                column("certificate"), column("runtime"), actor_columns,
+            )
+        ]
+        self._all_idx = np.arange(len(df))
+        self._genre_lower = [row.genre.lower() for row in self._rows]
+        self._bucket_idx: Optional[Dict[int, np.ndarray]] = None
+        ranking_col = next((col for col in df.columns if "ranking" in col.lower()), None)
+        if ranking_col is not None:
+            # Partition dataset into buckets for difficulties; unparseable ranks fall in no bucket
+            rank = pd.to_numeric(df[ranking_col], errors="coerce").to_numpy()
+            self._bucket_idx = {
+                1: np.flatnonzero(rank <= 50),
+                2: np.flatnonzero((rank > 50) & (rank <= 150)),
+                3: np.flatnonzero(rank > 150),
+            }
+        # Pre-build the samplers for every genre in the dataset; other genres fill in on first use
+        self._sampler: Dict[Tuple[int, str], Tuple[int, ...]] = {}
+        genre_keys = {""} | {token.strip() for genre in self._genre_lower for token in genre.split(",") if token.strip()}
+        for difficulty_level in (1, 2, 3):
+            for genre_key in genre_keys:
+                self._sampler[(difficulty_level, genre_key)] = self._candidate_rows(difficulty_level, genre_key)
+
+    def _ensure_kernel(self):
+        # A thread lock rather than asyncio.Lock: each request may run its own event loop
+        if self._kernel_ready:
+            return
+        with self._init_lock:
+            if not self._kernel_ready:
+                self._maybe_init_kernel()
+                self._kernel_ready = True
 
     def _maybe_init_kernel(self):
         # Prefer Google if available, else OpenAI, else fallback mode.
@@ -85,11 +696,16 @@ class QuizGenerator:
                 self.chat_service = None
                 self.kernel = None
                 self.execution_settings = None
-        elif OpenAIChatCompletion and openai_key:
+        elif google_key and not GoogleAIChatCompletion:
+            # semantic-kernel 0.9.x ships no Gemini connector (google_ai arrived in 1.x)
+            print("[QuizGenerator] ⚠️ Google connector not available in this semantic-kernel release")
+        if self.chat_service is None and OpenAIChatCompletion and openai_key:
             try:
+                self._openai_client = self._pooled_openai_client(openai_key)
                 self.chat_service = OpenAIChatCompletion(
-                    ai_model_id="gpt-4o-mini",
+                    ai_model_id=OPENAI_MODEL,
                     api_key=openai_key,
+                    async_client=self._openai_client,
                 )
                 self.kernel = Kernel()
                 self.kernel.add_service(self.chat_service)
@@ -103,273 +719,159 @@ class QuizGenerator:
                 self.chat_service = None
                 self.kernel = None
                 self.execution_settings = None
-        else:
-            print("[QuizGenerator] ⚠️ No API keys found, using fallback generation")
+        elif self.chat_service is None:
+            print("[QuizGenerator] ⚠️ No usable API key found, using fallback generation")
             # Fallback: no external service.
             return
 
-    def _select_movie_row(self, difficulty_level: int, preferred_genre: str = None) -> pd.Series:
-        # Simple heuristic: use ranking column if present else random.
-        df = self.df
-        
-        # Filter by genre if specified
-        if preferred_genre:
-            genre_filtered_df = df[df['genre'].str.contains(preferred_genre, case=False, na=False)]
-            if not genre_filtered_df.empty:
-                df = genre_filtered_df
-        
-        # Attempt to parse ranking integer from first column name.
-        ranking_col = None
-        for col in df.columns:
-            if "ranking" in col.lower():
-                ranking_col = col
-                break
-        if ranking_col is None:
-            return df.sample(1).iloc[0]
-        # Partition dataset into buckets for difficulties.
-        try:
-            df_sorted = df.copy()
-            df_sorted["_rank"] = pd.to_numeric(df_sorted[ranking_col], errors="coerce")
-            if difficulty_level == 1:
-                bucket = df_sorted[df_sorted["_rank"] <= 50]
-            elif difficulty_level == 2:
-                bucket = df_sorted[(df_sorted["_rank"] > 50) & (df_sorted["_rank"] <= 150)]
-            else:
-                bucket = df_sorted[df_sorted["_rank"] > 150]
-            if bucket.empty:
-                bucket = df_sorted
-            return bucket.sample(1).iloc[0]
-        except Exception:
-            return df.sample(1).iloc[0]
+    def _pooled_openai_client(self, api_key: str):
+        """AsyncOpenAI over one keep-alive httpx pool, driven by a dedicated event loop thread."""
+        import httpx  # Installed with the OpenAI connector
+        from openai import AsyncOpenAI
 
-    def _build_prompt(self, movie: pd.Series, difficulty_level: int, history: List[Dict[str, Any]]) -> str:
-        difficulty_map = {1: "easy", 2: "medium", 3: "hard"}
-        difficulty_word = difficulty_map.get(difficulty_level, "medium")
-        performance_summary = self._summarize_history(history)
-        
-        # Clean and prepare movie data
-        movie_name = str(movie.get('movie name', '')).strip()
-        year = str(movie.get('Year', '')).replace('-', '')
-        genre = str(movie.get('genre', '')).strip()
-        director = str(movie.get('DIRECTOR', '')).strip()
-        plot = str(movie.get('DETAIL ABOUT MOVIE', '')).strip()
-        rating = str(movie.get('RATING', '')).strip()
-        metascore = str(movie.get('metascore', '')).strip()
-        certificate = str(movie.get('certificate', '')).strip()
-        runtime = str(movie.get('runtime', '')).strip()
-        actor1 = str(movie.get('ACTOR 1', '')).strip()
-        actor2 = str(movie.get('ACTOR 2', '')).strip()
-        actor3 = str(movie.get('ACTOR 3', '')).strip()
-        actor4 = str(movie.get('ACTOR 4', '')).strip()
-        
-        # Get genre-specific focus areas
-        primary_genre = genre.split(',')[0].strip() if genre else "Drama"
-        genre_focus = self._get_genre_focus_areas(primary_genre)
-        
-        template = f"""
-You are an expert movie quiz generator specializing in {primary_genre.upper()} films. Create ONE creative {difficulty_word} multiple-choice question about the {primary_genre} movie below.
+        self._client_loop = asyncio.new_event_loop()
+        threading.Thread(target=self._client_loop.run_forever, name="llm-client-loop", daemon=True).start()
+        http_client = httpx.AsyncClient(limits=httpx.Limits(max_keepalive_connections=HTTP_MAX_KEEPALIVE))
+        return AsyncOpenAI(api_key=api_key, http_client=http_client)
 
-🎯 PRIORITIZE {primary_genre.upper()}-SPECIFIC QUESTIONS!
+    async def _on_client_loop(self, coro):
+        """Await coro on the loop that owns the pooled client (or directly when there is none)."""
+        if self._client_loop is None:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._client_loop))
 
-For {primary_genre} movies, focus on:
-{genre_focus}
+    async def _stream_on_client_loop(self, stream: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """Iterate an async stream on the client loop, handing items back to the caller's loop."""
+        if self._client_loop is None:
+            try:
+                async for item in stream:
+                    yield item
+            finally:
+                # Closing early (the caller stopped reading) releases the provider's connection now
+                aclose = getattr(stream, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+            return
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        end = object()
 
-You can also ask about:
-- {primary_genre}-typical plot elements and themes
-- Characteristic {primary_genre} cinematography/techniques  
-- Iconic {primary_genre} movie comparisons
-- {primary_genre} genre conventions and tropes
-- Cast known for {primary_genre} roles
-- Directors famous in the {primary_genre} genre
+        async def pump():
+            try:
+                async for item in stream:
+                    loop.call_soon_threadsafe(queue.put_nowait, item)
+                loop.call_soon_threadsafe(queue.put_nowait, end)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                # Cancelled when the caller stops early; close the stream here, on its own loop
+                aclose = getattr(stream, "aclose", None)
+                if aclose is not None:
+                    await aclose()
 
-Movie Information:
-Title: {movie_name}
-Year: {year}
-Genre: {genre} (PRIMARY: {primary_genre})
-Director: {director}
-Main Cast: {actor1}, {actor2}, {actor3}, {actor4}
-Plot: {plot}
-Rating: {rating}/10  |  Metascore: {metascore}
-Certificate: {certificate}  |  Runtime: {runtime}
+        future = asyncio.run_coroutine_threadsafe(pump(), self._client_loop)
+        try:
+            while True:
+                item = await queue.get()
+                if item is end:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
 
-User Performance: {performance_summary}
+    async def aclose(self):
+        """Close the pooled HTTP client and stop its event loop."""
+        if self._openai_client is not None:
+            await self._on_client_loop(self._openai_client.close())
+            self._openai_client = None
+        if self._client_loop is not None:
+            self._client_loop.call_soon_threadsafe(self._client_loop.stop)
+            self._client_loop = None
 
-Difficulty Guidelines for {primary_genre}:
-- EASY: Basic {primary_genre} facts (iconic scenes, main themes, lead roles)
-- MEDIUM: Specific {primary_genre} elements (genre techniques, character archetypes, plot devices)
-- HARD: Deep {primary_genre} knowledge (genre evolution, directorial style, cultural impact)
+    def _select_movie_row(self, difficulty_level: int, preferred_genre: str = None) -> MovieRow:
+        # Candidate rows per (difficulty, genre) are computed once; selection is a single pick
+        key = (difficulty_level if difficulty_level in (1, 2) else 3, preferred_genre.lower() if preferred_genre else "")
+        pool = self._sampler.get(key)
+        if pool is None:
+            pool = self._candidate_rows(*key)
+            if len(self._sampler) < SAMPLER_CACHE_SIZE:  # Genres come from user input, so stay bounded
+                self._sampler[key] = pool
+        return self._rows[self._rng.choice(pool)]
 
-Create a {difficulty_word} question that specifically tests {primary_genre} movie knowledge and genre expertise.
+    def _candidate_rows(self, difficulty_level: int, genre_key: str) -> Tuple[int, ...]:
+        """Rows in the difficulty bucket whose genre mentions genre_key, relaxing either filter if empty."""
+        pool = self._all_idx
+        if genre_key:
+            genre_idx = np.flatnonzero([genre_key in g for g in self._genre_lower])
+            if len(genre_idx):
+                pool = genre_idx
+        if self._bucket_idx is not None:
+            bucket = np.intersect1d(self._bucket_idx[difficulty_level], pool, assume_unique=True)
+            if len(bucket):
+                pool = bucket
+        return tuple(pool.tolist())
+
+    # Identical for every request, so provider prompt-prefix caches can reuse it
+    STATIC_SYSTEM_PROMPT = """
+You are an expert movie quiz generator. Create ONE creative multiple-choice question about the movie described by the user, at the difficulty the user asks for.
+
+Difficulty Guidelines:
+- EASY: Basic genre facts (iconic scenes, main themes, lead roles)
+- MEDIUM: Specific genre elements (genre techniques, character archetypes, plot devices)
+- HARD: Deep genre knowledge (genre evolution, directorial style, cultural impact)
 
 Format EXACTLY as:
-Q: <your {primary_genre}-focused question>
+Q: <your genre-focused question>
 A. <option 1>
-B. <option 2> 
+B. <option 2>
 C. <option 3>
 D. <option 4>
 Answer: <LETTER>
-
-Make it {primary_genre}-specific and genre-relevant!
 """
-        return template
-    
-    def _get_genre_focus_areas(self, genre: str) -> str:
-        """Get specific focus areas for different movie genres."""
-        genre_guides = {
-            "Action": """- High-octane sequences, stunts, and choreography
-- Weapon usage, fight scenes, and chase sequences  
-- Action heroes, villains, and their motivations
-- Special effects, explosions, and practical stunts
-- Franchise connections and action movie tropes""",
-            
-            "Drama": """- Character development and emotional arcs
-- Social issues, family dynamics, and relationships
-- Dramatic performances and award recognition
-- Real-life inspirations and biographical elements
-- Dialogue quality and meaningful themes""",
-            
-            "Comedy": """- Comedic timing, humor styles, and funny scenes
-- Comic actors and their signature roles
-- Parody elements and satirical themes
-- Memorable quotes and comedic situations
-- Different comedy sub-genres (rom-com, dark comedy, etc.)""",
-            
-            "Horror": """- Scare techniques, suspense building, and fear elements
-- Horror sub-genres (slasher, psychological, supernatural)
-- Iconic horror scenes and jump scares
-- Horror movie villains and monsters
-- Gore levels, practical effects, and makeup""",
-            
-            "Thriller": """- Suspense building and tension creation
-- Plot twists, mysteries, and reveals
-- Psychological elements and mind games
-- Chase sequences and cat-and-mouse dynamics
-- Paranoia themes and conspiracy elements""",
-            
-            "Romance": """- Love stories, relationship dynamics, and chemistry
-- Romantic leads and their on-screen partnerships
-- Meet-cute scenarios and romantic gestures
-- Heartbreak, passion, and emotional moments
-- Wedding scenes, proposals, and happy endings""",
-            
-            "Sci-Fi": """- Futuristic concepts, technology, and scientific themes
-- Space travel, aliens, and otherworldly elements
-- Time travel, dystopian futures, and alternate realities
-- Special effects, CGI, and visual innovation
-- Scientific accuracy and theoretical concepts""",
-            
-            "Fantasy": """- Magical elements, mythical creatures, and supernatural powers
-- World-building, fictional realms, and fantasy races
-- Quests, prophecies, and hero's journey narratives
-- Magic systems, spells, and fantasy combat
-- Adaptation from fantasy literature and folklore""",
-            
-            "Crime": """- Criminal activities, heists, and law enforcement
-- Detective work, investigations, and forensics
-- Organized crime, gangs, and criminal masterminds
-- Courtroom dramas and legal procedures
-- Moral ambiguity and crime consequences""",
-            
-            "Western": """- Old West settings, frontier life, and cowboy culture
-- Gunfights, saloons, and horseback riding
-- Outlaws, sheriffs, and justice themes
-- Desert landscapes and small town dynamics
-- Native American relations and historical context""",
-            
-            "War": """- Military tactics, battles, and warfare strategies
-- Historical conflicts and war periods
-- Soldier experiences, camaraderie, and sacrifice
-- War's impact on civilians and families
-- Anti-war messages and heroism themes""",
-            
-            "Animation": """- Animation techniques and visual styles
-- Voice acting and character performances
-- Family-friendly themes and life lessons
-- Studio signatures (Disney, Pixar, Studio Ghibli)
-- Technical innovation in animation""",
-            
-            "Documentary": """- Real-world subjects and factual content
-- Documentary filmmaking techniques
-- Educational value and information presented
-- Interview subjects and expert opinions
-- Social impact and awareness raising""",
-            
-            "Musical": """- Musical numbers, songs, and choreography
-- Musical theater adaptations and original scores
-- Singing performances and vocal talents
-- Dance sequences and performance staging
-- Broadway connections and show tunes"""
-        }
-        
-        return genre_guides.get(genre, """- Genre-specific themes and conventions
-- Typical character archetypes for this genre
-- Common plot devices and storytelling techniques
-- Visual and auditory elements characteristic of this genre
-- Cultural and historical context of the genre""")
 
+    def _build_prompt(self, movie: MovieRow, difficulty_level: int, history: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        """Build (role, content) chat messages ordered from most to least stable."""
+        genre = movie.genre
+        primary_genre = genre.split(',')[0].strip() if genre else "Drama"
+        return [
+            ("system", self.STATIC_SYSTEM_PROMPT),
+            ("system", _genre_system_prompt(primary_genre)),
+            ("user", self._dynamic_user_prompt(movie, difficulty_level, history)),
+        ]
+
+    def _dynamic_user_prompt(self, movie: MovieRow, difficulty_level: int, history: List[Dict[str, Any]]) -> str:
+        difficulty_word = DIFFICULTY_WORDS.get(difficulty_level, "medium")
+        return f"{_movie_user_prompt(movie, difficulty_word)}{self._summarize_history(history)}\n"
+    
     def _summarize_history(self, history: List[Dict[str, Any]]) -> str:
+        # Fixed key=value layout: identical history always yields an identical user message.
+        # Sessions keep only their last HISTORY_LIMIT answers, so the counts are labelled as recent.
         if not history:
-            return "No prior answers; start with baseline difficulty."
+            return "recent_answered=0; recent_correct=0; last=none; trend=none"
         correct_count = sum(1 for h in history if h.get("correct"))
-        last = history[-1]
+        last = "correct" if history[-1].get("correct") else "incorrect"
         trend = "improving" if len(history) > 2 and history[-1].get("correct") and history[-2].get("correct") else "mixed"
-        return (
-            f"Total answered: {len(history)}, correct: {correct_count}. Last answer was "
-            f"{'correct' if last.get('correct') else 'incorrect'}. Performance trend: {trend}."
-        )
+        return f"recent_answered={len(history)}; recent_correct={correct_count}; last={last}; trend={trend}"
 
-    def _fallback_generate(self, movie: pd.Series, difficulty_level: int) -> Dict[str, Any]:
+    def _fallback_generate(self, movie: MovieRow, difficulty_level: int) -> QuizQuestion:
         """Generate diverse, contextual questions using movie data when AI is unavailable."""
-        difficulty_map = {1: "easy", 2: "medium", 3: "hard"}
-        difficulty_word = difficulty_map.get(difficulty_level, "medium")
+        difficulty_word = DIFFICULTY_WORDS.get(difficulty_level, "medium")
         
-        # Clean movie data
-        movie_name = str(movie.get('movie name', 'Unknown')).strip()
-        year = str(movie.get('Year', '')).replace('-', '').strip()
-        genre = str(movie.get('genre', '')).strip()
-        director = str(movie.get('DIRECTOR', '')).strip()
-        plot = str(movie.get('DETAIL ABOUT MOVIE', '')).strip()
-        rating = str(movie.get('RATING', '')).strip()
-        metascore = str(movie.get('metascore', '')).strip()
-        runtime = str(movie.get('runtime', '')).strip()
-        certificate = str(movie.get('certificate', '')).strip()
-        actors = [str(movie.get(f'ACTOR {i}', '')).strip() for i in [1, 2, 3, 4] if str(movie.get(f'ACTOR {i}', '')).strip()]
+        movie_name, genre, director = movie.name, movie.genre, movie.director
         
         # Get primary genre for focused questions
         primary_genre = genre.split(',')[0].strip() if genre else "Drama"
         
-        # Define question templates by category and difficulty with genre focus
-        question_templates = {
-            1: [  # Easy questions
-                ("year", f"In which year was the {primary_genre.lower()} film '{movie_name}' released?", [year]),
-                ("director", f"Who directed the {primary_genre.lower()} movie '{movie_name}'?", [director]),
-                ("genre_identification", f"'{movie_name}' is primarily what type of {primary_genre.lower()} film?", [self._get_genre_subtype(primary_genre, plot)]),
-                ("lead_actor", f"Who stars in the {primary_genre.lower()} film '{movie_name}'?", [actors[0]] if actors else ["Unknown"]),
-                ("genre_theme", f"What {primary_genre.lower()} theme is central to '{movie_name}'?", [self._get_genre_theme(primary_genre, plot)]),
-            ],
-            2: [  # Medium questions  
-                ("genre_elements", f"What {primary_genre.lower()} elements make '{movie_name}' distinctive?", [self._get_genre_elements(primary_genre, plot)]),
-                ("genre_comparison", f"'{movie_name}' is similar to which other {primary_genre.lower()} film?", [self._get_genre_similar_movie(primary_genre)]),
-                ("genre_technique", f"What {primary_genre.lower()} filmmaking technique is used in '{movie_name}'?", [self._get_genre_technique(primary_genre)]),
-                ("genre_character", f"What type of {primary_genre.lower()} character archetype appears in '{movie_name}'?", [self._get_genre_archetype(primary_genre, actors)]),
-                ("genre_rating", f"How does '{movie_name}' rate among {primary_genre.lower()} films?", [self._get_genre_rating_context(rating, primary_genre)]),
-                ("runtime", f"What is the typical runtime for a {primary_genre.lower()} film like '{movie_name}'?", [self._get_runtime_range(runtime)]),
-            ],
-            3: [  # Hard questions
-                ("genre_innovation", f"How did '{movie_name}' innovate within the {primary_genre.lower()} genre?", [self._get_genre_innovation(primary_genre, year)]),
-                ("genre_influence", f"What {primary_genre.lower()} films influenced '{movie_name}'?", [self._get_genre_influence(primary_genre, year)]),
-                ("genre_subgenre", f"'{movie_name}' belongs to which {primary_genre.lower()} sub-genre?", [self._get_detailed_subgenre(primary_genre, plot)]),
-                ("genre_director_style", f"What {primary_genre.lower()} directorial style does '{director}' use in '{movie_name}'?", [self._get_director_genre_style(primary_genre, director)]),
-                ("genre_cultural_impact", f"How did '{movie_name}' impact the {primary_genre.lower()} genre?", [self._get_cultural_impact(primary_genre, year)]),
-            ]
-        }
-        
-        # Select random question type for difficulty level
-        available_questions = question_templates.get(difficulty_level, question_templates[1])
-        question_type, question, correct_answers = random.choice(available_questions)
+        # Pick the template first so only its answer is computed
+        available_questions = FALLBACK_TEMPLATES.get(difficulty_level, FALLBACK_TEMPLATES[1])
+        question_type, question_fmt, answer_fn = self._rng.choice(available_questions)
+        question = question_fmt.format(genre=primary_genre.lower(), name=movie_name, director=director)
+        correct_answer = answer_fn(self, movie, primary_genre)
         
         # Generate options based on question type
-        options, correct_idx = self._generate_options(question_type, correct_answers[0], movie, difficulty_level)
+        options, correct_idx = self._generate_options(question_type, correct_answer, movie, difficulty_level)
         
         return {
             "question": question,
@@ -378,105 +880,59 @@ Make it {primary_genre}-specific and genre-relevant!
             "difficulty": difficulty_word,
         }
     
-    def _generate_options(self, question_type: str, correct_answer: str, movie: pd.Series, difficulty_level: int) -> tuple:
+    def _generate_options(self, question_type: str, correct_answer: str, movie: MovieRow, difficulty_level: int) -> tuple:
         """Generate 4 options with 1 correct answer based on question type."""
         
-        # Common wrong options by category (expanded with genre-specific options)
-        wrong_options = {
-            "year": ["1995", "2001", "2010", "2015", "1999", "2005", "1990", "2008"],
-            "director": ["Christopher Nolan", "Steven Spielberg", "Quentin Tarantino", "Martin Scorsese", "Ridley Scott", "David Fincher"],
-            "genre": ["Drama", "Action", "Comedy", "Thriller", "Horror", "Romance", "Sci-Fi", "Adventure"],
-            "actor": ["Tom Hanks", "Leonardo DiCaprio", "Brad Pitt", "Robert De Niro", "Al Pacino", "Johnny Depp"],
-            "rating_range": ["6.0-7.0", "7.0-8.0", "8.0-9.0", "9.0-10.0"],
-            "runtime_range": ["90-120 minutes", "120-150 minutes", "150-180 minutes", "180+ minutes"],
-            "decade": ["1980s films", "1990s films", "2000s films", "2010s films"],
-            # Genre-specific wrong options
-            "genre_themes": ["Revenge and justice", "Love and relationships", "Good vs evil", "Coming of age", "Redemption story"],
-            "genre_elements": ["Visual spectacle", "Character development", "Emotional depth", "Technical mastery", "Cultural significance"],
-            "genre_movies": ["Citizen Kane", "The Godfather", "Casablanca", "Singin' in the Rain", "2001: A Space Odyssey"],
-            "genre_techniques": ["Innovative cinematography", "Masterful editing", "Exceptional sound design", "Outstanding performances", "Creative direction"],
-            "genre_archetypes": ["Reluctant hero", "Wise mentor", "Comic relief", "Love interest", "Villain mastermind"],
-            "genre_concepts": ["Groundbreaking storytelling", "Cultural phenomenon", "Technical innovation", "Artistic achievement", "Genre evolution"]
-        }
-        
         if question_type == "NOT_ACTOR":
             # Special case: which actor did NOT appear
-            actors = [str(movie.get(f'ACTOR {i}', '')).strip() for i in [1, 2, 3, 4] if str(movie.get(f'ACTOR {i}', '')).strip()]
-            fake_actors = ["Tom Hanks", "Leonardo DiCaprio", "Brad Pitt", "Will Smith"]
-            fake_actor = random.choice([a for a in fake_actors if a not in actors])
-            options = actors[:3] + [fake_actor]
-            random.shuffle(options)
-            return options, options.index(fake_actor)
+            actors = movie.actors
+            fake_actor = self._rng.choice([a for a in FAKE_ACTORS if a not in actors])
+            options = self._rng.sample(actors[:3], len(actors[:3]))
+            correct_idx = self._rng.randint(0, len(options))
+            options.insert(correct_idx, fake_actor)
+            return options, correct_idx
         
         # Standard case: generate 3 wrong + 1 correct
         category = self._get_option_category(question_type)
-        available_wrong = wrong_options.get(category, wrong_options.get("genre_themes", wrong_options["genre"]))
+        available_wrong = WRONG_OPTIONS.get(category, WRONG_OPTIONS["genre_themes"])
         
         # Filter out the correct answer from wrong options
-        available_wrong = [opt for opt in available_wrong if opt.lower() != correct_answer.lower()]
+        correct_lower = correct_answer.lower()
+        available_wrong = [opt for opt in available_wrong if opt.lower() != correct_lower]
         
-        # Select 3 random wrong options
-        wrong_selected = random.sample(available_wrong, min(3, len(available_wrong)))
+        # Select 3 random wrong options, already in random order
+        options = self._rng.sample(available_wrong, min(3, len(available_wrong)))
         
         # Ensure we have exactly 3 wrong options
-        while len(wrong_selected) < 3:
-            wrong_selected.append(f"Option {len(wrong_selected) + 1}")
+        while len(options) < 3:
+            options.append(f"Option {len(options) + 1}")
         
-        # Create final options list
-        options = wrong_selected + [correct_answer]
-        random.shuffle(options)
-        
-        return options, options.index(correct_answer)
+        # Drop the correct answer into a random slot so its index is known without a search
+        correct_idx = self._rng.randint(0, 3)
+        options.insert(correct_idx, correct_answer)
+        return options, correct_idx
     
     def _get_option_category(self, question_type: str) -> str:
         """Map question types to option categories."""
-        mapping = {
-            "year": "year", "year_context": "decade",
-            "director": "director", "lead_actor": "actor", "supporting_actor": "actor",
-            "genre": "genre", "genre_combo": "genre", "genre_identification": "genre",
-            "rating_range": "rating_range", "runtime": "runtime_range",
-            "metascore": "rating_range", "genre_rating": "rating_range",
-            # New genre-specific mappings
-            "genre_theme": "genre_themes", "genre_elements": "genre_elements",
-            "genre_comparison": "genre_movies", "genre_technique": "genre_techniques",
-            "genre_character": "genre_archetypes", "genre_innovation": "genre_concepts",
-            "genre_influence": "genre_movies", "genre_subgenre": "genre",
-            "genre_director_style": "genre_techniques", "genre_cultural_impact": "genre_concepts"
-        }
-        return mapping.get(question_type, "genre")
+        return OPTION_CATEGORIES.get(question_type, "genre")
     
-    def _get_rating_range(self, rating: str) -> str:
+    def _get_rating_range(self, rating: Optional[float]) -> str:
         """Convert numeric rating to range."""
-        try:
-            r = float(rating)
-            if r >= 9.0: return "9.0-10.0"
-            elif r >= 8.0: return "8.0-9.0" 
-            elif r >= 7.0: return "7.0-8.0"
-            else: return "6.0-7.0"
-        except:
+        if rating is None:
             return "7.0-8.0"
+        return RATING_BUCKETS[min(max(int(rating) - 6, 0), 3)]
     
-    def _get_runtime_range(self, runtime: str) -> str:
-        """Convert runtime to range."""
-        try:
-            minutes = int(''.join(filter(str.isdigit, runtime)))
-            if minutes >= 180: return "180+ minutes"
-            elif minutes >= 150: return "150-180 minutes"
-            elif minutes >= 120: return "120-150 minutes"
-            else: return "90-120 minutes"
-        except:
+    def _get_runtime_range(self, minutes: Optional[int]) -> str:
+        """Convert runtime in minutes to range."""
+        if minutes is None:
             return "120-150 minutes"
+        return RUNTIME_BUCKETS[min(max(minutes, 0) // 30, 6)]
     
-    def _get_metascore_range(self, metascore: str) -> str:
+    def _get_metascore_range(self, score: Optional[int]) -> str:
         """Convert metascore to range."""
-        try:
-            score = int(metascore)
-            if score >= 80: return "80-100 (Universal acclaim)"
-            elif score >= 60: return "60-79 (Generally positive)"
-            elif score >= 40: return "40-59 (Mixed reviews)"
-            else: return "Below 40 (Poor reviews)"
-        except:
+        if score is None:
             return "60-79 (Generally positive)"
+        return METASCORE_BUCKETS[min(max(score, 0) // 20, 5)]
     
     def _get_plot_theme(self, plot: str) -> str:
         """Extract main theme from plot."""
@@ -514,173 +970,144 @@ Make it {primary_genre}-specific and genre-relevant!
     
     def _get_similar_movie(self, genre: str) -> str:
         """Suggest similar movie based on genre."""
-        similar_movies = {
-            "Action": "Die Hard series",
-            "Drama": "The Shawshank Redemption", 
-            "Comedy": "Groundhog Day",
-            "Horror": "The Exorcist",
-            "Romance": "Casablanca",
-            "Sci-Fi": "Blade Runner"
-        }
-        return similar_movies.get(genre.split(',')[0].strip(), "Classic cinema")
+        return SIMILAR_MOVIES.get(genre.split(',')[0].strip(), "Classic cinema")
     
     # Genre-specific helper methods for focused question generation
     def _get_genre_subtype(self, genre: str, plot: str) -> str:
         """Determine the subtype within a genre."""
-        genre_subtypes = {
-            "Action": "High-octane thriller",
-            "Drama": "Character-driven story", 
-            "Comedy": "Situational comedy",
-            "Horror": "Psychological thriller",
-            "Romance": "Romantic drama",
-            "Sci-Fi": "Science fiction adventure",
-            "Thriller": "Suspense thriller",
-            "Crime": "Crime thriller",
-            "Western": "Classic western",
-            "War": "War drama"
-        }
-        return genre_subtypes.get(genre, "Drama")
+        return GENRE_SUBTYPES.get(genre, "Drama")
     
     def _get_genre_theme(self, genre: str, plot: str) -> str:
         """Get the main theme typical for the genre."""
-        genre_themes = {
-            "Action": "Good vs evil conflict",
-            "Drama": "Human relationships",
-            "Comedy": "Humor and life lessons", 
-            "Horror": "Fear and survival",
-            "Romance": "Love conquers all",
-            "Sci-Fi": "Technology and humanity",
-            "Thriller": "Suspense and mystery",
-            "Crime": "Justice and morality",
-            "Western": "Frontier justice",
-            "War": "Honor and sacrifice"
-        }
-        return genre_themes.get(genre, "Character development")
+        return GENRE_THEMES.get(genre, "Character development")
     
     def _get_genre_elements(self, genre: str, plot: str) -> str:
         """Get distinctive elements for the genre."""
-        genre_elements = {
-            "Action": "Explosive action sequences",
-            "Drama": "Emotional character arcs",
-            "Comedy": "Comedic timing and wit",
-            "Horror": "Suspenseful atmosphere",
-            "Romance": "Romantic chemistry",
-            "Sci-Fi": "Futuristic concepts",
-            "Thriller": "Edge-of-seat tension",
-            "Crime": "Criminal investigations",
-            "Western": "Frontier landscapes",
-            "War": "Combat realism"
-        }
-        return genre_elements.get(genre, "Strong storytelling")
+        return GENRE_ELEMENTS.get(genre, "Strong storytelling")
     
     def _get_genre_similar_movie(self, genre: str) -> str:
         """Get similar movies within the same genre."""
-        genre_comparisons = {
-            "Action": "Mission Impossible series",
-            "Drama": "Forrest Gump",
-            "Comedy": "The Hangover",
-            "Horror": "Halloween franchise", 
-            "Romance": "The Notebook",
-            "Sci-Fi": "Star Wars saga",
-            "Thriller": "North by Northwest",
-            "Crime": "Goodfellas",
-            "Western": "The Good, the Bad and the Ugly",
-            "War": "Saving Private Ryan"
-        }
-        return genre_comparisons.get(genre, "Similar acclaimed films")
+        return GENRE_COMPARISONS.get(genre, "Similar acclaimed films")
     
     def _get_genre_technique(self, genre: str) -> str:
         """Get filmmaking techniques typical for the genre."""
-        genre_techniques = {
-            "Action": "Dynamic camera work",
-            "Drama": "Character-focused cinematography",
-            "Comedy": "Comedic timing and editing",
-            "Horror": "Suspenseful sound design",
-            "Romance": "Intimate cinematography",
-            "Sci-Fi": "Visual effects mastery",
-            "Thriller": "Tension-building editing",
-            "Crime": "Noir-style lighting",
-            "Western": "Wide landscape shots",
-            "War": "Realistic battle choreography"
-        }
-        return genre_techniques.get(genre, "Cinematic storytelling")
+        return GENRE_TECHNIQUES.get(genre, "Cinematic storytelling")
     
     def _get_genre_archetype(self, genre: str, actors: list) -> str:
         """Get character archetypes typical for the genre."""
-        genre_archetypes = {
-            "Action": "Action hero protagonist",
-            "Drama": "Complex character study",
-            "Comedy": "Comedic lead character",
-            "Horror": "Survivor protagonist",
-            "Romance": "Romantic lead couple",
-            "Sci-Fi": "Reluctant hero",
-            "Thriller": "Ordinary person in danger",
-            "Crime": "Antihero protagonist",
-            "Western": "Lone gunslinger",
-            "War": "Soldier protagonist"
-        }
-        return genre_archetypes.get(genre, "Central character")
-    
-    def _get_genre_rating_context(self, rating: str, genre: str) -> str:
-        """Get rating context within the genre."""
-        try:
-            r = float(rating)
-            if r >= 8.5: return f"Top-tier {genre.lower()} film"
-            elif r >= 7.5: return f"Well-regarded {genre.lower()} movie"
-            elif r >= 6.5: return f"Decent {genre.lower()} entry"
-            else: return f"Average {genre.lower()} film"
-        except:
-            return f"Notable {genre.lower()} movie"
-    
-    def _get_genre_innovation(self, genre: str, year: str) -> str:
-        """Get how the film innovated within its genre."""
-        return f"Advanced {genre.lower()} filmmaking techniques"
-    
-    def _get_genre_influence(self, genre: str, year: str) -> str:
-        """Get films that influenced this one within the genre."""
-        return f"Classic {genre.lower()} cinema traditions"
-    
-    def _get_detailed_subgenre(self, genre: str, plot: str) -> str:
-        """Get specific sub-genre classification."""
-        subgenres = {
-            "Action": "Superhero action",
-            "Drama": "Social drama", 
-            "Comedy": "Romantic comedy",
-            "Horror": "Psychological horror",
-            "Thriller": "Political thriller",
-            "Sci-Fi": "Space opera",
-            "Crime": "Heist thriller"
-        }
-        return subgenres.get(genre, f"{genre} drama")
-    
-    def _get_director_genre_style(self, genre: str, director: str) -> str:
-        """Get the director's style within the genre."""
-        return f"Distinctive {genre.lower()} direction"
-    
-    def _get_cultural_impact(self, genre: str, year: str) -> str:
-        """Get the cultural impact within the genre."""
-        return f"Influenced modern {genre.lower()} films"
+        return GENRE_ARCHETYPES.get(genre, "Central character")
+
+    def generate_question(self, difficulty_level: int, history: List[Dict[str, Any]], preferred_genre: str = None) -> QuizQuestion:
+        """Synchronous wrapper around agenerate_question for callers without an event loop."""
+        return asyncio.run(self.agenerate_question(difficulty_level, history, preferred_genre))
+
+    async def generate_many(self, specs: List[Dict[str, Any]], concurrency: int = LLM_CONCURRENCY) -> List[QuizQuestion]:
+        """Generate one question per spec concurrently; specs hold agenerate_question kwargs."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def generate_one(spec: Dict[str, Any]) -> QuizQuestion:
+            async with semaphore:
+                return await self.agenerate_question(**spec)
 
-    def generate_question(self, difficulty_level: int, history: List[Dict[str, Any]], preferred_genre: str = None) -> Dict[str, Any]:
+        return await asyncio.gather(*(generate_one(spec) for spec in specs))
+
+    async def generate_questions_batch(self, count: int, difficulty_level: int, history: List[Dict[str, Any]], preferred_genre: str = None) -> List[QuizQuestion]:
+        """Generate `count` questions for one quiz state, with the LLM calls in flight together."""
+        spec = {"difficulty_level": difficulty_level, "history": history, "preferred_genre": preferred_genre}
+        return await self.generate_many([spec] * count)
+
+    async def generate_offline_batch(self, specs: List[Dict[str, Any]], poll_interval: float = BATCH_POLL_INTERVAL) -> List[QuizQuestion]:
+        """Bulk-generate questions for seeding, in spec order; specs hold agenerate_question kwargs.
+
+        With OpenAI this goes through the Batch API (half the token cost, results within 24h) and
+        polls until the batch finishes. Other providers have no batch endpoint, so the specs are
+        fanned out through generate_many instead. Missing or invalid results use the fallback.
+        History is optional in each spec on both paths.
+        """
+        specs = [{"history": [], **spec} for spec in specs]
+        self._ensure_kernel()
+        if not (OpenAIChatCompletion and isinstance(self.chat_service, OpenAIChatCompletion)) or ChatHistory is None:
+            return await self.generate_many(specs, concurrency=OFFLINE_CONCURRENCY)
+
+        from openai import AsyncOpenAI  # Installed with the OpenAI connector
+
+        movies = [self._select_movie_row(spec["difficulty_level"], spec.get("preferred_genre")) for spec in specs]
+        requests = []
+        for idx, (spec, movie) in enumerate(zip(specs, movies)):
+            if not self._is_promptable(movie):
+                continue  # Left out of the batch; falls back below
+            messages = self._build_prompt(movie, spec["difficulty_level"], spec["history"])
+            body = {
+                "model": OPENAI_MODEL,
+                "messages": [{"role": role, "content": content} for role, content in messages],
+                "max_tokens": getattr(self.execution_settings, "max_tokens", None),
+                "temperature": getattr(self.execution_settings, "temperature", None),
+            }
+            requests.append(json.dumps({"custom_id": str(idx), "method": "POST", "url": "/v1/chat/completions", "body": body}))
+
+        if not requests:
+            contents = {}
+        elif self._openai_client is not None:
+            contents = await self._on_client_loop(self._run_batch(self._openai_client, requests, poll_interval))
+        else:
+            async with AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")) as client:
+                contents = await self._run_batch(client, requests, poll_interval)
+
+        results = []
+        for idx, (spec, movie) in enumerate(zip(specs, movies)):
+            content = contents.get(str(idx))
+            parsed_result = self._parse_llm_output(content) if content is not None else None
+            if parsed_result is None or not self._validate_question(parsed_result, movie):
+                parsed_result = self._fallback_generate(movie, spec["difficulty_level"])
+            results.append(parsed_result)
+        return results
+
+    async def _run_batch(self, client, requests: List[str], poll_interval: float) -> Dict[str, str]:
+        """Submit JSONL batch requests and wait for them; returns response text by custom_id."""
+        contents: Dict[str, str] = {}
+        batch_file = await client.files.create(file=("questions.jsonl", "\n".join(requests).encode()), purpose="batch")
+        batch = await client.batches.create(
+            input_file_id=batch_file.id, endpoint="/v1/chat/completions", completion_window="24h"
+        )
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(poll_interval)
+            batch = await client.batches.retrieve(batch.id)
+        if batch.output_file_id:
+            output = await client.files.content(batch.output_file_id)
+            for line in output.text.splitlines():
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if response.get("status_code") == 200:
+                    contents[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+        return contents
+
+    async def agenerate_question(self, difficulty_level: int, history: List[Dict[str, Any]], preferred_genre: str = None) -> QuizQuestion:
+        self._ensure_kernel()
         movie = self._select_movie_row(difficulty_level, preferred_genre)
-        # If no kernel (no API key) use fallback.
+        # If no kernel (no API key) use fallback; so do rows the LLM could not write about.
         if self.kernel is None or self.chat_service is None or self.execution_settings is None:
             return self._fallback_generate(movie, difficulty_level)
+        if not self._is_promptable(movie):
+            return self._fallback_generate(movie, difficulty_level)
 
-        prompt = self._build_prompt(movie, difficulty_level, history)
+        messages = self._build_prompt(movie, difficulty_level, history)
         if ChatHistory is None:
             return self._fallback_generate(movie, difficulty_level)
-        chat_history = ChatHistory()
-        # Different versions use add_user_message or add_message
-        if hasattr(chat_history, 'add_user_message'):
-            chat_history.add_user_message(prompt)
-        else:
-            # Fallback generic attribute
-            chat_history.add_message('user', prompt)  # type: ignore
+        prompt = "\n".join(content for _, content in messages)
+
+        use_cache = self._cache_enabled()
+        cache_key = hashlib.sha256(prompt.encode()).hexdigest()
+        cache_scope = (movie.name, difficulty_level)
+        embedding = None
+        if use_cache:
+            cached = self._exact_cache.get(cache_key)
+            if cached is None and self._semantic_cache is not None:
+                # Embedding (and the first-use model load) is CPU/disk bound; keep it off the event loop
+                cached, embedding = await asyncio.to_thread(self._semantic_cache.get, cache_scope, prompt)
+            if cached is not None:
+                return dict(cached)
         try:
-            response = self.chat_service.get_chat_message_content(  # type: ignore
-                chat_history=chat_history, settings=self.execution_settings  # type: ignore
-            )
+            response = await self._on_client_loop(self._complete_chat(messages))
             # response may be list or single
             if isinstance(response, list):
                 content = response[0].content
@@ -688,41 +1115,151 @@ Make it {primary_genre}-specific and genre-relevant!
                 content = response.content  # type: ignore
         except Exception as e:
             # Fallback on failure
+            print(f"[QuizGenerator] LLM request failed, using fallback: {e!r}")
             return self._fallback_generate(movie, difficulty_level)
 
         parsed_result = self._parse_llm_output(content)
         
         # Validate the result and use fallback if necessary
         if not self._validate_question(parsed_result, movie):
-            print(f"AI question validation failed, using fallback for {movie.get('movie name', 'Unknown')}")
+            print(f"AI question validation failed, using fallback for {movie.name or 'Unknown'}")
             return self._fallback_generate(movie, difficulty_level)
-            
-        return parsed_result
+
+        if use_cache:
+            self._exact_cache.set(cache_key, parsed_result)
+            if embedding is not None:
+                self._semantic_cache.set(cache_scope, embedding, parsed_result)
+        return dict(parsed_result)
+
+    async def generate_stream(self, difficulty_level: int, history: List[Dict[str, Any]], preferred_genre: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a question field by field as the LLM produces it.
+
+        Yields {"event": "question", "text": ...} and then {"event": "option", "index": i, "text": ...}
+        as each field completes, followed by {"event": "done", "question": {...}}. The final event is
+        authoritative: a response that fails validation is replaced by a fallback question.
+        The stream is closed as soon as the answer letter arrives, and abandoned for the fallback
+        if STREAM_ABORT_CHARS of output pass without a question marker.
+        """
+        self._ensure_kernel()
+        movie = self._select_movie_row(difficulty_level, preferred_genre)
+        if (self.kernel is None or self.chat_service is None or self.execution_settings is None
+                or ChatHistory is None or not self._is_promptable(movie)):
+            yield {"event": "done", "question": self._fallback_generate(movie, difficulty_level)}
+            return
+
+        messages = self._build_prompt(movie, difficulty_level, history)
+        buffer = ""
+        emitted = 0
+        malformed = False
+        feed = None
+        try:
+            feed = self._stream_on_client_loop(self._complete_chat_stream(messages))
+            async for chunks in feed:
+                for chunk in chunks if isinstance(chunks, list) else [chunks]:
+                    buffer += str(chunk.content or "")
+                fields = _STREAM_FIELD_RE.findall(buffer)
+                for marker, text in fields[emitted:]:
+                    text = text.strip().replace('\n', ' ')
+                    if marker == "Q:":
+                        yield {"event": "question", "text": text}
+                    else:
+                        yield {"event": "option", "index": ord(marker[0]) - 65, "text": text}
+                emitted = max(emitted, len(fields))
+                if _RESP_RE.search(buffer):
+                    break  # Everything needed is in; don't wait on trailing tokens
+                if len(buffer) >= STREAM_ABORT_CHARS and not emitted and not ("q:" in buffer.lower() or "question" in buffer.lower()):
+                    malformed = True
+                    break
+        except Exception as e:
+            print(f"[QuizGenerator] LLM stream failed, using fallback: {e!r}")
+            malformed = True
+        finally:
+            if feed is not None:
+                await feed.aclose()
+        if malformed:
+            yield {"event": "done", "question": self._fallback_generate(movie, difficulty_level)}
+            return
+
+        parsed_result = self._parse_llm_output(buffer)
+        if not self._validate_question(parsed_result, movie):
+            print(f"AI question validation failed, using fallback for {movie.name or 'Unknown'}")
+            parsed_result = self._fallback_generate(movie, difficulty_level)
+        yield {"event": "done", "question": parsed_result}
+
+    def _complete_chat(self, messages: List[Tuple[str, str]]):
+        """Chat completion coroutine for the installed semantic-kernel API.
+
+        1.x services expose get_chat_message_content; the pinned 0.9.x only has complete_chat.
+        Settings are copied because 0.9.x writes the request messages onto them.
+        """
+        chat_history, settings = self._chat_history(messages), self._request_settings()
+        if hasattr(self.chat_service, "get_chat_message_content"):
+            return self.chat_service.get_chat_message_content(chat_history=chat_history, settings=settings)  # type: ignore
+        return self.chat_service.complete_chat(chat_history=chat_history, settings=settings)  # type: ignore
+
+    def _complete_chat_stream(self, messages: List[Tuple[str, str]]) -> AsyncIterator[Any]:
+        """Streaming counterpart of _complete_chat; yields lists of message chunks."""
+        chat_history, settings = self._chat_history(messages), self._request_settings()
+        if hasattr(self.chat_service, "get_streaming_chat_message_contents"):
+            return self.chat_service.get_streaming_chat_message_contents(chat_history=chat_history, settings=settings)  # type: ignore
+        return self.chat_service.complete_chat_stream(chat_history=chat_history, settings=settings)  # type: ignore
+
+    def _request_settings(self):
+        copy = getattr(self.execution_settings, "model_copy", None)
+        return copy() if copy is not None else self.execution_settings
+
+    def _chat_history(self, messages: List[Tuple[str, str]]) -> "ChatHistory":
+        chat_history = ChatHistory()
+        for role, content in messages:
+            # Different versions use add_<role>_message or add_message
+            add_message = getattr(chat_history, f'add_{role}_message', None)
+            if add_message is not None:
+                add_message(content)
+            else:
+                # Fallback generic attribute
+                chat_history.add_message(role, content)  # type: ignore
+        return chat_history
+
+    def _cache_enabled(self) -> bool:
+        temperature = getattr(self.execution_settings, "temperature", None)
+        return temperature is not None and temperature <= CACHE_MAX_TEMPERATURE
     
-    def _validate_question(self, question_data: Dict[str, Any], movie: pd.Series) -> bool:
-        """Validate that the generated question makes sense."""
+    @staticmethod
+    def _is_promptable(movie: MovieRow) -> bool:
+        """Pre-flight check on the row, before paying for an LLM round-trip."""
+        return bool(movie.name.strip() and movie.genre.strip())
+
+    def _validate_question(self, question_data: QuizQuestion, movie: MovieRow) -> bool:
+        """Validate that the generated question makes sense.
+
+        Only structural problems reject the question. One that merely leaves out the movie
+        title is kept and gets the title prepended, instead of being regenerated by the fallback.
+        """
+        if not self._structural_valid(question_data):
+            return False
+        if not self._semantic_valid(question_data, movie):
+            question_data["question"] = f"In the movie '{movie.name}': {question_data['question']}"
+        return True
+
+    @staticmethod
+    def _structural_valid(question_data: QuizQuestion) -> bool:
+        """Question text, four real options and an in-range answer index."""
         try:
             question = question_data.get("question", "")
             options = question_data.get("options", [])
             answer_index = question_data.get("answer_index", 0)
             
-            # Basic validation
-            if len(question) < 10:
+            # Basic validation; parse failures carry an error or placeholder text
+            if "error" in question_data or len(question) < 10 or question == "Unable to parse question properly":
                 return False
             if len(options) != 4:
                 return False
             if answer_index < 0 or answer_index >= 4:
                 return False
             
-            # Check if question mentions the movie
-            movie_name = str(movie.get('movie name', '')).strip()
-            if movie_name and len(movie_name) > 3:
-                if movie_name.lower() not in question.lower():
-                    return False
-            
-            # Check that options are not empty or too short
-            for option in options:
-                if not option or len(option.strip()) < 2:
+            # Check that options are not empty, too short or unparsed placeholders
+            for letter, option in zip("ABCD", options):
+                if not option or len(option.strip()) < 2 or option == f"Option {letter}":
                     return False
             
             return True
@@ -730,83 +1267,150 @@ Make it {primary_genre}-specific and genre-relevant!
         except Exception:
             return False
 
-    def _parse_llm_output(self, text: str) -> Dict[str, Any]:
+    @staticmethod
+    def _semantic_valid(question_data: QuizQuestion, movie: MovieRow) -> bool:
+        """Whether the question mentions the movie; titles of three characters or fewer are not checked."""
+        if len(movie.name) > 3:
+            return movie.name_lower in question_data["question"].lower()
+        return True
+
+    @staticmethod
+    def _parse_response(text: str) -> Optional[QuizQuestion]:
+        """Parse a well-formed Q:/A.-D./Answer: response, or return None if it deviates."""
+        match = _RESP_RE.search(text)
+        if match is None:
+            return None
+        question, *options, answer_letter = match.groups()
+        return {
+            "question": question.strip().replace('\n', ' '),
+            "options": [option.strip().replace('\n', ' ') for option in options],
+            "answer_index": ord(answer_letter) - 65,  # 'A' -> 0
+            "difficulty": "unknown",
+        }
+
+    @staticmethod
+    def _scan_lines(text: str) -> Tuple[Optional[str], Dict[str, str], Optional[str]]:
+        """Single forward pass over 'Q:' / 'A.' / 'Answer:' lines (bold markers ignored); returns (question, options, answer)."""
+        question = None
+        found_options: Dict[str, str] = {}
+        answer_letter = None
+        current = None  # Field that unlabeled continuation lines belong to
+        for line in text.splitlines():
+            line = line.replace("**", "").strip()
+            if not line:
+                continue
+            lower = line.lower()
+            if len(line) > 1 and line[1] in ".:)" and line[0].upper() in "ABCD":
+                current = line[0].upper()
+                found_options[current] = line[2:].strip()
+            elif lower.startswith(("q:", "question:")):
+                current = "Q"
+                question = line.split(":", 1)[1].strip()
+            elif lower.startswith(("answer:", "correct", "the correct answer is")):
+                current = None
+                # Same rules as _find_answer_letter: "correct" needs a colon, only the
+                # "the correct answer is" prefix may be followed by a bare letter
+                if ":" in line:
+                    rest = line.split(":", 1)[1]
+                elif lower.startswith("the correct answer is"):
+                    rest = line[len("the correct answer is"):]
+                else:
+                    rest = ""
+                letter = rest.replace("*", "").strip()[:1].upper()
+                if answer_letter is None and letter in ("A", "B", "C", "D"):
+                    answer_letter = letter
+            elif current == "Q":
+                question = f"{question} {line}".strip()
+            elif current is not None:
+                found_options[current] = f"{found_options[current]} {line}"
+        return question or None, found_options, answer_letter
+
+    @staticmethod
+    def _find_answer_letter(text: str) -> Optional[str]:
+        """Letter after the first answer marker that has one, found with plain substring scans."""
+        lowered = text.lower()
+        for marker in _ANSWER_MARKERS:
+            start = lowered.find(marker)
+            while start >= 0:
+                pos = start + len(marker)
+                if marker == "correct":
+                    colon = lowered.find(":", pos)
+                    line_end = lowered.find("\n", pos)
+                    pos = colon + 1 if colon >= 0 and (line_end < 0 or colon < line_end) else -1
+                if pos >= 0:
+                    while pos < len(text) and (text[pos].isspace() or text[pos] == "*"):
+                        pos += 1
+                    if pos < len(text) and lowered[pos] in "abcd":
+                        return lowered[pos].upper()
+                start = lowered.find(marker, start + 1)
+        return None
+
+    @staticmethod
+    def _raw_excerpt(text: str) -> str:
+        return f"{text[:200]}..." if len(text) > 200 else text
+
+    def _parse_llm_output(self, text: str) -> QuizQuestion:
         """Parse AI response with robust error handling and validation."""
         try:
             # Clean the text
             text = text.strip()
+
+            parsed = self._parse_response(text)
+            if parsed is not None and len(parsed["question"]) >= 10:
+                if self.debug:
+                    parsed["raw_response"] = self._raw_excerpt(text)
+                return parsed
+
+            # Response strayed from the requested format: one line-by-line pass handles most variants
+            question, found_options, answer_letter = self._scan_lines(text)
             
-            # Extract question - try multiple patterns
-            question = None
-            question_patterns = [
-                r"Q:\s*(.+?)(?=\n[A-D]\.|$)",  # Q: question until option A-D
-                r"Question:\s*(.+?)(?=\n[A-D]\.|$)",  # Question: alternative
-                r"\*\*Question\*\*:\s*(.+?)(?=\n[A-D]\.|$)",  # **Question**: markdown
-            ]
-            
-            for pattern in question_patterns:
-                match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
-                if match:
-                    question = match.group(1).strip().replace('\n', ' ')
-                    break
-            
+            # Markdown-wrapped or inline layouts: fill whatever the scan missed with the looser patterns
             if not question:
-                # Fallback: take first line as question
+                for pattern in _QUESTION_PATTERNS:
+                    match = pattern.search(text)
+                    if match:
+                        question = match.group(1).strip().replace('\n', ' ')
+                        break
+            
+            unmarked = not question
+            if unmarked:
+                # Fallback: take first line as question. Often a preamble ("Sure! Here is..."),
+                # so the result is flagged below and fails structural validation.
                 lines = text.split('\n')
                 question = lines[0].strip() if lines else "Unable to parse question"
             
-            # Extract options - more robust parsing
-            options = []
-            option_patterns = [
-                r"([A-D])\.\s*(.+?)(?=\n[A-D]\.|\nAnswer:|$)",  # A. option
-                r"\*\*([A-D])\*\*[\.:)]\s*(.+?)(?=\n[A-D]\.|\nAnswer:|$)",  # **A**: option
-            ]
-            
-            found_options = {}
-            for pattern in option_patterns:
-                matches = re.findall(pattern, text, re.DOTALL | re.IGNORECASE)
-                for letter, option_text in matches:
-                    found_options[letter.upper()] = option_text.strip().replace('\n', ' ')
+            if len(found_options) < 4:
+                for match in _OPTION_RE.finditer(text):
+                    letter = match.group("plain") or match.group("bold")
+                    found_options.setdefault(letter.upper(), match.group("text").strip().replace('\n', ' '))
             
             # Ensure we have all 4 options
-            for letter in ['A', 'B', 'C', 'D']:
-                if letter in found_options:
-                    options.append(found_options[letter])
-                else:
-                    options.append(f"Option {letter}")
+            options = [found_options.get(letter, f"Option {letter}") for letter in "ABCD"]
             
-            # Extract answer - try multiple patterns
-            answer_letter = 'A'  # Default
-            answer_patterns = [
-                r"Answer:\s*([A-D])",
-                r"Correct.*?:\s*([A-D])",
-                r"\*\*Answer\*\*:\s*([A-D])",
-                r"The correct answer is\s*([A-D])"
-            ]
-            
-            for pattern in answer_patterns:
-                match = re.search(pattern, text, re.IGNORECASE)
-                if match:
-                    answer_letter = match.group(1).upper()
-                    break
+            if answer_letter is None:
+                answer_letter = self._find_answer_letter(text) or 'A'  # Default
             
             # Validate answer letter
-            if answer_letter not in ['A', 'B', 'C', 'D']:
+            if not ('A' <= answer_letter <= 'D'):
                 answer_letter = 'A'
             
-            answer_index = ['A', 'B', 'C', 'D'].index(answer_letter)
+            answer_index = ord(answer_letter) - 65  # 'A' -> 0
             
             # Validate that we have reasonable content
             if len(question) < 10:
                 question = "Unable to parse question properly"
             
-            return {
+            result: QuizQuestion = {
                 "question": question,
                 "options": options,
                 "answer_index": answer_index,
                 "difficulty": "unknown",
-                "raw_response": text[:200] + "..." if len(text) > 200 else text  # For debugging
             }
+            if unmarked:
+                result["error"] = "No question marker in response"
+            if self.debug:
+                result["raw_response"] = self._raw_excerpt(text)
+            return result
             
         except Exception as e:
             # Complete fallback
@@ -0,0 +1,164 @@
+"""
+Key/value stores for users, scores and quiz sessions.
+
+Everything lives in process memory by default. When REDIS_URL is set the
+stores are backed by Redis instead, so several gunicorn workers (or a
+restarted process) see the same state.
+"""
+import os
+import pickle
+from collections import OrderedDict
+from threading import RLock
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+REDIS_URL = os.getenv("REDIS_URL")
+_redis_client = None
+
+
+class MemoryStore:
+    """Thread-safe in-process store with optional least-recently-used eviction."""
+
+    def __init__(self, max_items: Optional[int] = None):
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._max_items = max_items
+        self._lock = RLock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            value = self._data.get(key)
+            # Recency only matters when capped; uncapped stores keep insertion order
+            if value is not None and self._max_items is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def get_many(self, keys: Iterable[str]) -> List[Any]:
+        with self._lock:
+            return [self._data.get(key) for key in keys]
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = value
+            if self._max_items is not None:
+                self._data.move_to_end(key)
+                self._evict()
+
+    def add(self, key: str, value: Any) -> bool:
+        """Store value only if key is absent; returns whether it was stored."""
+        with self._lock:
+            if key in self._data:
+                return False
+            self._data[key] = value
+            self._evict()
+            return True
+
+    def pop(self, key: str) -> Any:
+        with self._lock:
+            return self._data.pop(key, None)
+
+    def update(self, key: str, fn: Callable[[Any], Any]) -> Any:
+        """Atomically replace the value with fn(value); returns it, or None if key is absent."""
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                return None
+            value = fn(value)
+            self.set(key, value)
+            return value
+
+    def items(self) -> List[Tuple[str, Any]]:
+        # Snapshot so callers can iterate while other threads write
+        with self._lock:
+            return list(self._data.items())
+
+    def _evict(self):
+        if self._max_items is not None:
+            while len(self._data) > self._max_items:
+                self._data.popitem(last=False)
+
+
+class RedisStore:
+    """Redis-backed store; values are pickled under '<prefix><key>'."""
+
+    def __init__(self, client, prefix: str, ttl: Optional[int] = None):
+        self._client = client
+        self._prefix = prefix
+        self._ttl = ttl
+
+    def get(self, key: str) -> Any:
+        raw = self._client.get(self._prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def get_many(self, keys: Iterable[str]) -> List[Any]:
+        keys = [self._prefix + key for key in keys]
+        if not keys:
+            return []
+        return [pickle.loads(raw) if raw is not None else None for raw in self._client.mget(keys)]
+
+    def set(self, key: str, value: Any, pipe=None):
+        """Store value; pass a pipeline to batch the write with other commands."""
+        (pipe or self._client).set(self._prefix + key, pickle.dumps(value), ex=self._ttl)
+
+    def add(self, key: str, value: Any) -> bool:
+        return bool(self._client.set(self._prefix + key, pickle.dumps(value), ex=self._ttl, nx=True))
+
+    def update(self, key: str, fn: Callable[[Any], Any], on_write: Optional[Callable[[Any], Any]] = None) -> Any:
+        """Replace the value with fn(value) under WATCH/MULTI, retrying if another writer got there first.
+
+        on_write(pipe) may queue more commands to commit in the same transaction. Returns the
+        new value, or None if key is absent.
+        """
+        from redis.exceptions import WatchError  # Only needed when Redis is configured
+
+        full_key = self._prefix + key
+        with self._client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(full_key)
+                    raw = pipe.get(full_key)
+                    if raw is None:
+                        return None
+                    value = fn(pickle.loads(raw))
+                    pipe.multi()
+                    pipe.set(full_key, pickle.dumps(value), ex=self._ttl)
+                    if on_write is not None:
+                        on_write(pipe)
+                    pipe.execute()
+                    return value
+                except WatchError:
+                    continue
+
+    def pop(self, key: str) -> Any:
+        pipe = self._client.pipeline()
+        pipe.get(self._prefix + key)
+        pipe.delete(self._prefix + key)
+        raw, _ = pipe.execute()
+        return pickle.loads(raw) if raw is not None else None
+
+    def items(self) -> List[Tuple[str, Any]]:
+        keys = list(self._client.scan_iter(match=self._prefix + "*", count=500))
+        if not keys:
+            return []
+        start = len(self._prefix)
+        return [
+            (key.decode()[start:], pickle.loads(raw))
+            for key, raw in zip(keys, self._client.mget(keys))
+            if raw is not None
+        ]
+
+
+def get_redis():
+    """Shared Redis client, or None when REDIS_URL is not configured."""
+    global _redis_client
+    if REDIS_URL and _redis_client is None:
+        import redis  # Only needed when Redis is configured
+
+        _redis_client = redis.Redis.from_url(REDIS_URL)
+    return _redis_client
+
+
+def create_store(prefix: str, max_items: Optional[int] = None, ttl: Optional[int] = None):
+    """Redis store when REDIS_URL is set, otherwise a MemoryStore capped at max_items."""
+    client = get_redis()
+    if client is not None:
+        return RedisStore(client, prefix, ttl=ttl)
+    return MemoryStore(max_items=max_items)
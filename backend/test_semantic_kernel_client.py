@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import shutil
+import sys
+import types
+
+import pytest
+
+import semantic_kernel_client as skc
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "movies.csv")
+
+
+@pytest.fixture(scope="module")
+def csv_copy(tmp_path_factory):
+    """The dataset in a temp dir, so the Parquet cache is not written into the working tree."""
+    path = tmp_path_factory.mktemp("dataset") / "movies.csv"
+    shutil.copy(CSV_PATH, path)
+    return str(path)
+
+
+def _answer_for(messages) -> str:
+    """A well-formed response about the movie named in the user message."""
+    user = [m["content"] for m in messages if m["role"] == "user"][-1]
+    title = user.split("Title: ")[1].split("\n")[0]
+    return f"Q: Who directed '{title}'?\nA. Alpha One\nB. Bravo Two\nC. Charlie Three\nD. Delta Four\nAnswer: C"
+
+
+def _fake_openai(request):
+    import httpx
+
+    body = json.loads(request.content)
+    text = _answer_for(body["messages"])
+    base = {"id": "chatcmpl-test", "created": 0, "model": body["model"]}
+    if not body.get("stream"):
+        return httpx.Response(200, json={
+            **base, "object": "chat.completion",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+    events = [
+        {**base, "object": "chat.completion.chunk",
+         "choices": [{"index": 0, "finish_reason": None, "delta": {"role": "assistant", "content": text[i:i + 9]}}]}
+        for i in range(0, len(text), 9)
+    ]
+    events.append({**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "finish_reason": "stop", "delta": {}}]})
+    sse = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+    return httpx.Response(200, content=sse.encode(), headers={"content-type": "text/event-stream"})
+
+
+@pytest.fixture
+def openai_generator(monkeypatch, csv_copy):
+    """QuizGenerator wired to the real OpenAI connector, with HTTP answered in-process."""
+    httpx = pytest.importorskip("httpx")
+    if skc.OpenAIChatCompletion is None:
+        pytest.skip("OpenAI connector not installed")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    pooled = skc.QuizGenerator._pooled_openai_client
+
+    def mocked_pool(self, api_key):
+        client = pooled(self, api_key)
+        return client.with_options(http_client=httpx.AsyncClient(transport=httpx.MockTransport(_fake_openai)))
+
+    monkeypatch.setattr(skc.QuizGenerator, "_pooled_openai_client", mocked_pool)
+    generator = skc.QuizGenerator(csv_path=csv_copy)
+    yield generator
+    asyncio.run(generator.aclose())
+
+
+def test_llm_question_through_openai_connector(openai_generator):
+    question = openai_generator.generate_question(2, [], "Drama")
+    assert question["options"] == ["Alpha One", "Bravo Two", "Charlie Three", "Delta Four"]
+    assert question["answer_index"] == 2
+
+
+def test_llm_stream_through_openai_connector(openai_generator):
+    async def consume():
+        return [event async for event in openai_generator.generate_stream(2, [], "Drama")]
+
+    events = asyncio.run(consume())
+    assert [event["event"] for event in events] == ["question", "option", "option", "option", "option", "done"]
+    assert events[-1]["question"]["options"][2] == "Charlie Three"
+
+
+@pytest.fixture(scope="module")
+def generator(csv_copy):
+    return skc.QuizGenerator(csv_path=csv_copy)
+
+
+def test_preamble_without_question_marker_is_rejected(generator):
+    movie = generator._rows[0]
+    parsed = generator._parse_llm_output(
+        "Sure! Here is a quiz question for you:\n\nWhich actor played Andy Dufresne?\n"
+        "A. Tim Robbins\nB. Morgan Freeman\nC. Bob Gunton\nD. Clancy Brown\nAnswer: A"
+    )
+    assert not generator._validate_question(parsed, movie)
+
+
+def test_marked_question_missing_title_is_patched(generator):
+    movie = generator._rows[0]
+    parsed = generator._parse_llm_output(
+        "Question: Which actor played Andy Dufresne?\n"
+        "A. Tim Robbins\nB. Morgan Freeman\nC. Bob Gunton\nD. Clancy Brown\nAnswer: A"
+    )
+    assert generator._validate_question(parsed, movie)
+    assert parsed["question"] == f"In the movie '{movie.name}': Which actor played Andy Dufresne?"
+
+
+@pytest.mark.parametrize("answer_line, expected", [
+    ("Correct!", None),
+    ("Correct answer explained below", None),
+    ("Correct answer: D", "D"),
+    ("The correct answer is B.", "B"),
+    ("Answer: c", "C"),
+])
+def test_line_scan_answer_agrees_with_find(answer_line, expected):
+    text = f"Question: Who directed it?\nA. One\nB. Two\nC. Three\nD. Four\n{answer_line}"
+    assert skc.QuizGenerator._scan_lines(text)[2] == expected
+    assert skc.QuizGenerator._find_answer_letter(text) == expected
+
+
+def test_semantic_cache_loads_model_once(monkeypatch):
+    import threading
+    import time
+
+    import numpy as np
+
+    loads = []
+
+    class FakeModel:
+        def __init__(self, name):
+            time.sleep(0.05)
+            loads.append(name)
+
+        def encode(self, text, normalize_embeddings=True):
+            return np.ones(4) / 2
+
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(SentenceTransformer=FakeModel))
+    cache = skc._SemanticCache("fake-model", threshold=0.9, max_entries=8)
+    threads = [threading.Thread(target=cache.get, args=(("Movie", 1), "prompt")) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == ["fake-model"]
+
+
+def test_offline_batch_history_is_optional_without_openai(generator):
+    questions = asyncio.run(generator.generate_offline_batch([{"difficulty_level": 1, "preferred_genre": "Drama"}] * 2))
+    assert len(questions) == 2 and all(len(q["options"]) == 4 for q in questions)
@@ -0,0 +1,40 @@
+import threading
+
+import pytest
+
+from storage import MemoryStore, RedisStore
+
+
+def _increment_concurrently(store, workers: int = 8, rounds: int = 25):
+    def work():
+        for _ in range(rounds):
+            store.update("u1", lambda stats: {**stats, "total_score": stats["total_score"] + 1})
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return workers * rounds
+
+
+def test_memory_update_is_atomic():
+    store = MemoryStore()
+    store.set("u1", {"total_score": 0})
+    expected = _increment_concurrently(store)
+    assert store.get("u1")["total_score"] == expected
+    assert store.update("missing", lambda stats: stats) is None
+
+
+def test_redis_update_is_atomic_and_commits_extra_commands():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    # One client per store, as separate gunicorn workers would have
+    stores = [RedisStore(fakeredis.FakeRedis(server=server), "scores:") for _ in range(2)]
+    stores[0].set("u1", {"total_score": 0})
+    expected = _increment_concurrently(stores[0]) + _increment_concurrently(stores[1])
+    assert stores[1].get("u1")["total_score"] == expected
+
+    client = fakeredis.FakeRedis(server=server)
+    stores[0].update("u1", lambda stats: stats, on_write=lambda pipe: pipe.zincrby("lb", 5, "u1"))
+    assert client.zscore("lb", "u1") == 5